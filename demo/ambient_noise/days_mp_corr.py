@@ -5,7 +5,7 @@ import re
 import time
 import obspy
 import scipy.signal as signal
-from obspy.geodetics import gps2dist_azimuth
+from seisloc.geometry import vincenty
 import pdb
 import math
 import matplotlib.pyplot as plt
@@ -296,6 +296,11 @@ def day_wf_corr(args):
     CFtime = np.linspace(-max_shift_num,max_shift_num,2*max_shift_num+1)/fs_new
     nptCF = len(CFtime)
     CFdict = {}
+    # Station distance, the same for all days
+    dist,_,_ = vincenty(args.sta_dict[args.sta1]["coords"][0],
+                        args.sta_dict[args.sta1]["coords"][1],
+                        args.sta_dict[args.sta2]["coords"][0],
+                        args.sta_dict[args.sta2]["coords"][1])
 
     # loop for years
     for yr in range(year_range[0],year_range[1]+1):
@@ -331,10 +336,6 @@ def day_wf_corr(args):
                 tr2.detrend("linear")
                 tr2.detrend("constant")
                 tr2.filter("bandpass",freqmin=freq_range[0],freqmax=freq_range[-1],zerophase=True)
-                dist,_,_ = gps2dist_azimuth(args.sta_dict[args.sta1]["coords"][0],
-                                            args.sta_dict[args.sta1]["coords"][1],
-                                            args.sta_dict[args.sta2]["coords"][0],
-                                            args.sta_dict[args.sta2]["coords"][1])
                 sta_dist = dist/1000                               # kilometer
                 # noise cross-correlation with time-domain normalization
                 CFcnMB = cross_correlation(tr2,tr1,args.period_band,max_lagtime,args.corr_method)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+#-----------------------------------------------------------------------------
+#   Micro-benchmark of the batch geodesic functions in seisloc.geometry
+#   against per-pair obspy gps2dist_azimuth calls, for the cases of
+#   gen_dtcc (event pairs), sta_dist_pairs (station distance matrix) and
+#   sta_sel (one center against many stations).
+#
+#     Usage: python bench_geodesic.py [--pairs 20000] [--stations 200]
+#-----------------------------------------------------------------------------
+import time
+import argparse
+import numpy as np
+from obspy.geodetics import gps2dist_azimuth
+from seisloc.geometry import vincenty,haversine
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs",
+                        default=20000,
+                        type=int,
+                        help="quantity of random event pairs")
+    parser.add_argument("--stations",
+                        default=200,
+                        type=int,
+                        help="quantity of stations of the distance matrix")
+    return parser.parse_args()
+
+def timeit(func,repeat=3):
+    """
+    Best wall time of repeat runs and the output of the last run
+    """
+    best = None
+    for i in range(repeat):
+        t1 = time.time()
+        out = func()
+        cost = time.time()-t1
+        if best == None or cost < best:
+            best = cost
+    return best,out
+
+def report(name,t_loop,t_batch,diff):
+    print(f"{name:<24s} loop {t_loop*1000:10.2f} ms  batch {t_batch*1000:8.2f} ms"
+          f"  speedup {t_loop/t_batch:8.1f}  max diff {diff:.2e} m")
+
+if __name__ == "__main__":
+    args = read_args()
+    rng = np.random.default_rng(0)
+    # Events in a 1 degree region as a relocation catalog
+    lat1 = rng.uniform(29,30,args.pairs); lon1 = rng.uniform(104,105,args.pairs)
+    lat2 = rng.uniform(29,30,args.pairs); lon2 = rng.uniform(104,105,args.pairs)
+    vincenty(lat1[:2],lon1[:2],lat2[:2],lon2[:2])      # JIT compile before timing
+
+    t_loop,ref = timeit(lambda:np.array([gps2dist_azimuth(*v)[0] for v in zip(lat1,lon1,lat2,lon2)]),1)
+    t_batch,out = timeit(lambda:vincenty(lat1,lon1,lat2,lon2)[0])
+    report("event pairs, vincenty",t_loop,t_batch,np.max(np.abs(out-ref)))
+    t_hav,out = timeit(lambda:haversine(lat1,lon1,lat2,lon2)*1000)
+    report("event pairs, haversine",t_loop,t_hav,np.max(np.abs(out-ref)))
+
+    slat = rng.uniform(25,35,args.stations); slon = rng.uniform(100,110,args.stations)
+    def loop_matrix():
+        return np.array([[gps2dist_azimuth(a,b,c,d)[0] for c,d in zip(slat,slon)] for a,b in zip(slat,slon)])
+    t_loop,ref = timeit(loop_matrix,1)
+    t_batch,out = timeit(lambda:vincenty(slat[:,None],slon[:,None],slat[None,:],slon[None,:])[0])
+    report("station matrix",t_loop,t_batch,np.max(np.abs(out-ref)))
+
+    t_loop,ref = timeit(lambda:np.array([gps2dist_azimuth(30,105,a,b)[0] for a,b in zip(slat,slon)]))
+    t_batch,out = timeit(lambda:vincenty(30,105,slat,slon)[0])
+    report("center to stations",t_loop,t_batch,np.max(np.abs(out-ref)))
@@ -24,9 +24,8 @@ Create input event.dat, phase pair (dt.ct) and waveform cross-correlation
         dt.cc       - cross-correlation pair
 
         [ For intermediate step ]
-        event_stream.p      - temporal storage of event wf
-        event_stream_p.p    - temporal storage of P arrival wf
-        event_stream_s.p    - temporal storage of S arrival wf
+        event_wf_store/     - waveform store of event, P and S arrival wf
+                              (index.txt and shard_*.npz)
         event_id_mapper.p   - temporal storage of hypoDD id to catalog id mapper
         hypodd_subset.p     - temporal storage of subseted obspy.catalog object
 
@@ -40,9 +39,11 @@ from eqcorrscan.utils.catalog_to_dd import write_event,\
                                         write_catalog, \
                                         read_phase,\
                                         write_correlations
-from obspy.geodetics.base import gps2dist_azimuth
-from obspy.signal.cross_correlation import correlate, xcorr_max
-import os, glob, pickle
+from seisloc.eqcorr import correlate_event_pairs, write_dtcc, \
+                           extract_event_streams
+from seisloc.wf.wfstore import WfStore
+from seisloc.cccache import CcCache
+import os, glob, pickle, shutil
 from tqdm import tqdm
 
 
@@ -69,8 +70,15 @@ def _subset_event_time(event, starttime, endtime, verbose=True):
 
 def get_event_stream(event_catalog, starttime, endtime, waveform_dir, 
     time_before_arrival=2, time_after_arrival=3,
-    verbose=False, dump=False, filter_kwargs=None):
+    verbose=False, dump=False, filter_kwargs=None, store_dir="event_wf_store",
+    day_major=True, cpu_cores=0):
     """ Generate dictionary of event waveforms based on event.resource_id.id
+    With dump=True, waveforms are written event by event into the waveform
+    store (seisloc.wf.wfstore) under store_dir instead of kept in memory, and
+    lazy views of the store are returned.
+    With day_major=True, windows of all picks of a day are cut from a
+    station-trace dict in one pass (seisloc.eqcorr.day_event_streams) and
+    days are processed on cpu_cores processes (0 for all cores).
     Return:
         Dictionary with keys of event.resoruce_id of 
             1) event waveform
@@ -81,6 +89,33 @@ def get_event_stream(event_catalog, starttime, endtime, waveform_dir,
     event_stream = dict()
     event_stream_p = dict()
     event_stream_s = dict()
+    if dump:
+        store = WfStore(store_dir, mode="a")
+
+    if day_major:
+        day_tasks = []
+        for tt in range(0, int(endtime - starttime), int(24*60*60)):
+            _sttime = starttime + tt
+            _edtime = _sttime + 24*60*60
+            year = str(_sttime.year)
+            doy = str(_sttime.julday).zfill(3)
+            day_hypodd_subset = _subset_event_time(event_catalog,
+                                                    _sttime, _edtime, verbose=False)
+            if len(day_hypodd_subset)==0:
+                continue
+            events = []
+            for event in day_hypodd_subset:
+                picks = [[pick.waveform_id.station_code[-3:], pick.phase_hint, pick.time]
+                                                    for pick in event.picks]
+                events.append([event.resource_id.id, event.origins[0].time, picks])
+            day_files = glob.glob(os.path.join(waveform_dir, year, doy, "*seed"))
+            day_tasks.append([day_files, events, time_before_arrival,
+                              time_after_arrival, filter_kwargs, 60])
+        if dump:
+            extract_event_streams(day_tasks, cpu_cores=cpu_cores, store=store)
+            store.close()
+            return store.view("all"), store.view("P"), store.view("S")
+        return extract_event_streams(day_tasks, cpu_cores=cpu_cores)
 
     pbar = tqdm(range(0, int(endtime - starttime), int(24*60*60)))
 
@@ -141,17 +176,18 @@ def get_event_stream(event_catalog, starttime, endtime, waveform_dir,
             if verbose:
                 print(_event_stream_P)
             _event_stream.merge()
+            if dump:
+                store.add_stream(event_id, "all", _event_stream)
+                store.add_stream(event_id, "P", _event_stream_P)
+                store.add_stream(event_id, "S", _event_stream_S)
+                continue
             event_stream[event_id] = _event_stream 
             event_stream_p[event_id] = _event_stream_P
             event_stream_s[event_id] = _event_stream_S 
     
     if dump:
-        ### temporal store event_id_mapper and event_stream to save time
-        pickle.dump(hypodd_subset, open("hypodd_subset.p", "wb"))
-        pickle.dump(event_id_mapper, open("event_id_mapper.p", "wb"))
-        pickle.dump(event_stream, open("event_stream.p", "wb"))
-        pickle.dump(event_stream_p, open("event_stream_p.p", "wb"))
-        pickle.dump(event_stream_s, open("event_stream_s.p", "wb"))
+        store.close()
+        return store.view("all"), store.view("P"), store.view("S")
 
 
     return event_stream, event_stream_p, event_stream_s
@@ -170,88 +206,34 @@ def _gen_event_lat_lon(catalog):
     return event_lat, event_lon
 
 
-def _correlation_stream(st1, st2, shift=2):
-    """ 
-    para:   shift - maxshift in seconds
-    Return: shifttime, cc value
-    """
-    sampling_rate = st1.stats.sampling_rate
-    cc = correlate(st1.data, st2.data, int(sampling_rate*shift))
-    shift, value = xcorr_max(cc)
-    return shift/sampling_rate, value
-
-
 def correlate_event_stream(catalog, event_stream_p, event_stream_s, 
                             event_id_mapper, max_sep=20, min_link=5, min_cc=0.5,
-                            max_shift=2,verbose=False, vverbose=False):
+                            max_shift=2, cpu_cores=0, verbose=False, vverbose=False,
+                            cache=None, cache_params={}):
+    """ Correlate event pairs within max_sep km, see 
+    seisloc.eqcorr.correlate_event_pairs. Pair results are read from and
+    written into cache (seisloc.cccache.CcCache) if provided.
+    Return: event_pair_id, event_pair_cc
+    """
     event_lat, event_lon = _gen_event_lat_lon(catalog)
-    event_list = list(event_stream.keys())
-    event_pair_id = dict()
-    event_pair_cc = dict()
-
-    pbar = tqdm(total = len(event_list)*(len(event_list)-1)/2)
-    for i, event_id_1 in enumerate(event_list):
-        for event_id_2 in event_list[(i+1):]:
-            # Check event distance
-            dist, _, _ = gps2dist_azimuth(event_lat[event_id_1],
-                                    event_lon[event_id_1],
-                                    event_lat[event_id_2],
-                                    event_lon[event_id_2])
-            if dist/1000 > max_sep: 
-                continue
-             
-            # waveform correlation 
-            pair_id = event_id_1+event_id_2
-            pair_id_mapper = [event_id_1, event_id_2, event_id_mapper[event_id_1], event_id_mapper[event_id_2]]
-            event_pair_id[pair_id] = pair_id_mapper
-
-            # Progress bar
-            pbar.update(1)
-            pbar.set_description("Processing %s " % pair_id)
-
-            link_cc = []
-            for tr1 in event_stream_p[event_id_1].select(component="*Z"):
-                 for tr2 in event_stream_p[event_id_2].select(component="*Z"):
-                    if tr1.stats.station == tr2.stats.station:
-                        shift, value = _correlation_stream(tr1, tr2, shift=max_shift)
-                        if value < min_cc:
-                            continue
-                        if vverbose:
-                            print([tr1.stats.station, shift, value, 'P'])
-                        link_cc.append([tr1.stats.station, shift, value, 'P'])
-
-            for tr1 in event_stream_s[event_id_1].select(component="*Z"):
-                 for tr2 in event_stream_s[event_id_2].select(component="*Z"):
-                    if tr1.stats.station == tr2.stats.station:
-                        shift, value = _correlation_stream(tr1, tr2, shift=max_shift)
-                        if value < min_cc:
-                            continue
-                        link_cc.append([tr1.stats.station, shift, value, 'S'])
-
-            if len(link_cc) < min_link:
-                link_cc = []
-            if verbose:
-                print(pair_id)
-                print(link_cc)
-            event_pair_cc[pair_id] = link_cc
-
-    pbar.close()
+    event_list = list(event_stream_p.keys())
+    event_pair_id, event_pair_cc = correlate_event_pairs(event_list, 
+                                        event_lat, event_lon,
+                                        event_stream_p, event_stream_s,
+                                        event_id_mapper, max_sep=max_sep,
+                                        min_link=min_link, min_cc=min_cc,
+                                        max_shift=max_shift, cpu_cores=cpu_cores,
+                                        cache=cache, cache_params=cache_params)
+    if verbose:
+        for pair_id in event_pair_id:
+            print(pair_id)
+            print(event_pair_cc[pair_id])
  
     return event_pair_id, event_pair_cc
 
 
 def _parse_to_dtcc(event_pair_id, event_pair_cc, f_dtcc='dt.cc'):
-    with open(f_dtcc, 'w+') as dt_cc_f:
-        event_id_list = list(event_pair_id.keys())
-        for eve_id in event_id_list:
-            [_, _, id1, id2] = event_pair_id[eve_id] 
-            link_cc = event_pair_cc[eve_id]
-            if len(link_cc)==0:
-                continue
-            dt_cc_f.write("#   %i  %i   0 \n" % (id1, id2))
-            for link in link_cc:
-                dt_cc_f.write("%s %.3f %.3f %s \n" % tuple(link))
-    print("Created dt.cc")
+    write_dtcc(event_pair_id, event_pair_cc, f_dtcc=f_dtcc)
 
     return None
      
@@ -277,7 +259,8 @@ if __name__ == "__main__":
 
     ### 2 Cross-correlation Configurations
     load_prebuilt = False           # Select true if event waveforms are stored
-                                    #   event_stream.p, ...
+                                    #   in store_dir, ...
+    store_dir = "event_wf_store"
     
     ## Continuous wf directory
     # Waveform store in waveform_dir/year/doy
@@ -298,6 +281,10 @@ if __name__ == "__main__":
     min_link_cc = 4
     min_cc = 0.5
     max_shift=1.0
+    cpu_cores = 0           # 0 indicates using all cores
+    cc_cache = "cc_cache.sqlite"    # Cache of pair results reused by reruns,
+                                    #   None to disable
+    cc_cache_size = 1024            # Maximum cache size in MB
 
 
 
@@ -323,11 +310,17 @@ if __name__ == "__main__":
 
     # Generate event stream
     if load_prebuilt == False:
+        if os.path.exists(store_dir):
+            shutil.rmtree(store_dir)
+        ### temporal store event_id_mapper to save time
+        pickle.dump(hypodd_subset, open("hypodd_subset.p", "wb"))
+        pickle.dump(event_id_mapper, open("event_id_mapper.p", "wb"))
         event_stream, event_stream_p, event_stream_s = get_event_stream(hypodd_subset,
                                                 starttime, endtime, waveform_dir,
                                                 time_before_arrival=before_arrival,
                                                 time_after_arrival=after_arrival,
-                                                filter_kwargs=filter_kwargs, dump=True)
+                                                filter_kwargs=filter_kwargs, dump=True,
+                                                store_dir=store_dir, cpu_cores=cpu_cores)
     
 
     ### load previous event_id_mapper, event_stream
@@ -337,15 +330,20 @@ if __name__ == "__main__":
             hypodd_subset = pickle.load(f_event_list)
         with open("event_id_mapper.p", "rb") as f_event_id:
             event_id_mapper = pickle.load(f_event_id)
-        with open("event_stream.p", "rb") as f_event_st:
-            event_stream = pickle.load(f_event_st)
-        with open("event_stream_p.p", "rb") as f_event_st:
-            event_stream_p = pickle.load(f_event_st)
-        with open("event_stream_s.p", "rb") as f_event_st:
-            event_stream_s = pickle.load(f_event_st)
+        # Only Z traces are read, and only when correlated
+        store = WfStore(store_dir)
+        event_stream = store.view("all")
+        event_stream_p = store.view("P", component="Z")
+        event_stream_s = store.view("S", component="Z")
 
 
     ### Compute 2.2 Conduct CC over event streams
+    # Pairs are keyed by waveform content, window and filter settings
+    cache = None
+    if cc_cache is not None:
+        cache = CcCache(cc_cache, max_bytes=int(cc_cache_size*1024**2))
+    cache_params = {"filter": str(filter_kwargs),
+                    "window": (before_arrival, after_arrival)}
     # Conduct CC
     event_pair_id, event_pair_cc = correlate_event_stream(hypodd_subset, 
                                                         event_stream_p, 
@@ -355,7 +353,10 @@ if __name__ == "__main__":
                                                         min_cc=min_cc,
                                                         min_link=min_link_cc,
                                                         max_shift=max_shift,
-                                                        verbose=False)  
+                                                        cpu_cores=cpu_cores,
+                                                        verbose=False,
+                                                        cache=cache,
+                                                        cache_params=cache_params)
     # Create file (./dt.cc)
     _parse_to_dtcc(event_pair_id, event_pair_cc, f_dtcc='dt.cc')
 
@@ -4,6 +4,7 @@
 #     History: 
 #             2021-02-26 Initiate coding
 #             2021-06-14 Update parser
+#             2026-10-18 Add in-process python engine
 #-----------------------------------------------------------------------------
 
 import os
@@ -14,7 +15,13 @@ import time
 import re
 import warnings
 import shutil
+import queue
+import numpy as np
 from obspy import UTCDateTime
+from seisloc.scc import parse_scc_cmd,arr_scc,write_scc_store
+from seisloc.geometry import neighbour_lists
+from seisloc.wf.wfbank import build_wf_bank,WfBank
+from seisloc.cccache import CcCache
 
 def read_args():
     parser = argparse.ArgumentParser()
@@ -31,9 +38,42 @@ def read_args():
                         default=0,
                         type=int,
                         help="0 indicates using all cores")
+    parser.add_argument("--chunks_per_core",
+                        default=4,
+                        type=int,
+                        help="quantity of cost-balanced template chunks for each core")
     parser.add_argument("--sum_file",
                         default="out.sum",
                         help="the output file of HYPOINVERSE")
+    parser.add_argument("--max_sep",
+                        default=4,
+                        type=float,
+                        help="maximum separation in km of events to be correlated")
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="continue an interrupted run, chunks recorded in the journal are skipped")
+    parser.add_argument("--incremental",
+                        action="store_true",
+                        help="only correlate lines appended to the arrival files since the last complete run")
+    parser.add_argument("--engine",
+                        default="python",
+                        help="'python' correlates in-process with seisloc.scc, 'c' pipes to the scc program")
+    parser.add_argument("--method",
+                        default="fft",
+                        help="'fft', 'loop' or 'numba' kernel for the python engine")
+    parser.add_argument("--wf_bank",
+                        action="store_true",
+                        help="pack windows of each station-phase into one memory-mapped bank read by the python engine")
+    parser.add_argument("--cc_cache",
+                        default=None,
+                        help="sqlite file caching pair results of the python engine, reused by reruns with the same windows")
+    parser.add_argument("--cc_cache_size",
+                        default=1024,
+                        type=float,
+                        help="maximum size of the cc cache in MB, least recently used results are evicted")
+    parser.add_argument("--write_xc",
+                        action="store_true",
+                        help="also write the text *.xc results besides the binary *.npz store")
     args = parser.parse_args()
     return args
 
@@ -54,18 +94,10 @@ def load_sum_rev(sum_file):
     return sum_dict
 
 
-def scc_c(args,sta_pha,point1,point2):
-    '''
-    SCC written by C is used here because C runs much faster than python. 
-    Even though python SCC script has been developed.
-    '''
-    sum_rev_dict = load_sum_rev(args.sum_file) # Read in event information
-    print("Templates range: %d %d " %(point1,point2))
-    xc_file =f"{sta_pha}/{sta_pha}.{format(point1,'05d')}.xc"
-    f = open(xc_file,'w')                  # Initiate result file
-    f.close()
-
-    # Here we re-read arr files rather than deliver parameters from mp_scc()
+def read_arr(args,sta_pha):
+    """
+    Read in lines of the arrival file of one station-phase
+    """
     content= []
     arr_file = os.path.join(args.af_folder,sta_pha+".arr")
     with open(arr_file,"r")as f:
@@ -73,6 +105,79 @@ def scc_c(args,sta_pha,point1,point2):
             line = line.rstrip()
             content.append(line)
     f.close()
+    return content
+
+def build_neighbours(content,sum_rev_dict,max_sep):
+    """
+    Spatial index of the events in one arrival file, built once per
+    station-phase. For the i-th line, return the index of later lines whose
+    event lies within max_sep km of the i-th event.
+    """
+    evlos = []
+    evlas = []
+    for line in content:
+        e_path = re.split(" +",line)[0] # Format is "Path Arri_time 1"
+        eve_folder = re.split("\/",e_path)[-2]
+        evlos.append(sum_rev_dict[eve_folder][1])
+        evlas.append(sum_rev_dict[eve_folder][2])
+    return neighbour_lists(evlos,evlas,max_sep)
+
+def read_evids(content,sum_rev_dict):
+    """
+    Event id of each line of the arrival file
+    """
+    evids = []
+    for line in content:
+        e_path = re.split(" +",line)[0]
+        eve_folder = re.split("\/",e_path)[-2]
+        evids.append(sum_rev_dict[eve_folder][0])
+    return np.array(evids,dtype=np.int32)
+
+def chunk_name(sta_pha,point1,base=0):
+    """
+    Result file name without suffix. Chunks of an incremental run starting
+    from template quantity base are named with the base to keep earlier
+    results.
+    """
+    if base == 0:
+        return f"{sta_pha}/{sta_pha}.{format(point1,'05d')}"
+    return f"{sta_pha}/{sta_pha}.{format(base,'05d')}_{format(point1,'05d')}"
+
+def remove_chunks(sta_pha,base=0):
+    """
+    Remove result files (*.npz, *.xc and their *.tmp) of the chunks of a
+    run before its chunks are replanned, so SccStore and gen_dtcc do not
+    mix them with the new results. Chunks of runs with other base, e.g. the
+    full run before an incremental run, are kept.
+    """
+    if base == 0:
+        pattern = re.escape(sta_pha)+r"\.\d+\.(npz|xc)"
+    else:
+        pattern = re.escape(sta_pha)+r"\."+format(base,'05d')+r"_\d+\.(npz|xc)"
+    for file in os.listdir(sta_pha):
+        if re.match(pattern,file):
+            os.remove(os.path.join(sta_pha,file))
+
+def scc_c(args,sta_pha,point1,point2,neighbours,evids,base=0):
+    '''
+    SCC written by C is used here because C runs much faster than python. 
+    Even though python SCC script has been developed.
+    neighbours: target line index of templates point1 to point2-1
+         evids: event id of each line of the arrival file
+          base: template quantity of the previous run for incremental run
+    Results are saved in the binary store {sta_pha}.{point1}.npz, and also
+    in the text file {sta_pha}.{point1}.xc if args.write_xc
+    '''
+    print("Templates range: %d %d " %(point1,point2))
+    xc_file = chunk_name(sta_pha,point1,base)+".xc"
+    tmp_file = xc_file+".tmp"              # Renamed when the chunk is complete
+    if args.write_xc:
+        f = open(tmp_file,'w')             # Initiate result file
+        f.close()
+    evid1s = []; evid2s = []; dts = []; ccs = []; aas = []
+
+    # Here we re-read arr files rather than deliver parameters from mp_scc()
+    content = read_arr(args,sta_pha)
     if sta_pha[-1]=="S":
         cmd =args.S_scc+"\n"
         #-C0.6:    threshold
@@ -84,74 +189,336 @@ def scc_c(args,sta_pha,point1,point2):
         cmd = args.P_scc+"\n"
         # P segment should be short than S waveform
     for i in range(point1,point2):
+        if len(neighbours[i-point1]) == 0:
+            continue
         s = content[i]+"\n"
-        e_path = re.split(" +",content[i])[0] # Format is "Path Arri_time 1"
-        tmplt_folder = re.split("\/",e_path)[-2]
-        tmplt_stlo = sum_rev_dict[tmplt_folder][1]
-        tmplt_stla = sum_rev_dict[tmplt_folder][2]
-        for line in content[i+1:]:
-            e_path = re.split(" +",line)[0] # Format is "Path Arri_time 1"
-            tar_folder = re.split("\/",e_path)[-2]
-            tar_stlo = sum_rev_dict[tar_folder][1]
-            tar_stla = sum_rev_dict[tar_folder][2]
-            # Accept pairs with 0.04 degree range
-            if abs(tmplt_stlo-tar_stlo)<0.04 and abs(tmplt_stla-tar_stla)<0.04:
-                s+= f"{line}\n"
+        for j in neighbours[i-point1]:
+            s+= f"{content[j]}\n"
         pipe = subprocess.Popen(cmd,shell=True,stdin=subprocess.PIPE,stdout=subprocess.PIPE).communicate(s.encode())
         result = re.split(r"\n",pipe[0].decode('utf-8'))
-        with open(xc_file,'a') as f:
-            for tmp in result[1:-1]:
-                f.write(content[i]+" "+tmp+"\n")
-        f.close()
+        tmplt_arr = float(re.split(" +",content[i])[1])
+        tar_index = {re.split(" +",content[j])[0]:j for j in neighbours[i-point1]}
+        for tmp in result[1:-1]:
+            path,arr,_,cc,aa = re.split(" +",tmp.strip())
+            evid1s.append(evids[i])
+            evid2s.append(evids[tar_index[path]])
+            dts.append(tmplt_arr-float(arr))
+            ccs.append(float(cc))
+            aas.append(float(aa))
+        if args.write_xc:
+            with open(tmp_file,'a') as f:
+                for tmp in result[1:-1]:
+                    f.write(content[i]+" "+tmp+"\n")
+            f.close()
+    write_scc_store(chunk_name(sta_pha,point1,base)+".npz",sta_pha[:-2],sta_pha[-1],
+                    evid1s,evid2s,dts,ccs,aas)
+    if args.write_xc:
+        os.replace(tmp_file,xc_file)
+
+def scc_py(args,sta_pha,point1,point2,neighbours,evids,base=0):
+    '''
+    The same task as scc_c, but correlates in-process with seisloc.scc.arr_scc,
+    each template against all its targets in one batch. With args.wf_bank,
+    windows are sliced from the waveform bank instead of read from sac files.
+    With args.cc_cache, pairs of unchanged windows are read from the cache.
+    Lines of the *.xc file follow the format of the scc program.
+    '''
+    print("Templates range: %d %d " %(point1,point2))
+    xc_file = chunk_name(sta_pha,point1,base)+".xc"
+    content = read_arr(args,sta_pha)
+    if sta_pha[-1]=="S":
+        para = parse_scc_cmd(args.S_scc)
+    if sta_pha[-1]=="P":
+        para = parse_scc_cmd(args.P_scc)
+    evid1s = []; evid2s = []; dts = []; ccs = []; aas = []
+    lines = []
+    for i in range(point1,point2):
+        if len(neighbours[i-point1]) == 0:
+            continue
+        tmplt_path,_tmplt_arr = re.split(" +",content[i])[:2]
+        tar_lines = [re.split(" +",content[j]) for j in neighbours[i-point1]]
+        tar_paths = [tmp[0] for tmp in tar_lines]
+        if args.wf_bank:
+            results = open_bank(sta_pha).scc(i,neighbours[i-point1],
+                                             cc_threshold=para["cc_threshold"],method=args.method,
+                                             cache=open_cache(args))
+        else:
+            tar_arrs = [float(tmp[1]) for tmp in tar_lines]
+            results = arr_scc(tmplt_path,float(_tmplt_arr),tar_paths,tar_arrs,
+                              method=args.method,cache=open_cache(args),**para)
+        for k,arr,cc,aa in results:
+            evid1s.append(evids[i])
+            evid2s.append(evids[neighbours[i-point1][k]])
+            dts.append(float(_tmplt_arr)-arr)
+            ccs.append(cc)
+            aas.append(aa)
+            if args.write_xc:
+                lines.append(f"{content[i]} {tar_paths[k]} {format(arr,'10.3f')} {tar_lines[k][2]} {format(cc,'6.3f')} {format(aa,'8.2e')}\n")
+    write_scc_store(chunk_name(sta_pha,point1,base)+".npz",sta_pha[:-2],sta_pha[-1],
+                    evid1s,evid2s,dts,ccs,aas)
+    if args.write_xc:
+        with open(xc_file+".tmp",'w') as f:
+            f.writelines(lines)
+        os.replace(xc_file+".tmp",xc_file)  # Chunk complete
+
+_banks = {}                                  # Waveform banks opened by this process
+
+def bank_path(sta_pha):
+    return os.path.join(sta_pha,f"{sta_pha}.bank")
+
+def open_bank(sta_pha):
+    """
+    Open the waveform bank once per worker process, the data is shared
+    between processes through the page cache
+    """
+    if sta_pha not in _banks:
+        _banks[sta_pha] = WfBank(bank_path(sta_pha))
+    return _banks[sta_pha]
+
+_caches = {}                                 # Correlation caches opened by this process
 
-def mp_scc(args,sta_pha):
+def open_cache(args):
+    """
+    Open the cc cache once per worker process, None if not used
+    """
+    if args.cc_cache == None:
+        return None
+    if args.cc_cache not in _caches:
+        _caches[args.cc_cache] = CcCache(args.cc_cache,max_bytes=int(args.cc_cache_size*1024**2))
+    return _caches[args.cc_cache]
+
+def prepare_bank(args,sta_pha,para,evids):
+    """
+    Build the waveform bank of one station-phase if not available or
+    built with other window parameters, events, waveform paths or picks
+    """
+    arr_file = os.path.join(args.af_folder,sta_pha+".arr")
+    if os.path.exists(bank_path(sta_pha)+".idx"):
+        bank = WfBank(bank_path(sta_pha))
+        content = read_arr(args,sta_pha)
+        paths = [re.split(" +",line.strip())[0] for line in content]
+        arrs = [float(re.split(" +",line.strip())[1]) for line in content]
+        if bank.matches(para["tb"],para["te"],para["max_shift"],para["ncom"],len(evids),
+                        evids=evids,paths=paths,arrs=arrs):
+            return
+    _banks.pop(sta_pha,None)
+    build_wf_bank(arr_file,bank_path(sta_pha),para["tb"],para["te"],
+                  para["max_shift"],para["ncom"],evids)
+
+def journal_path(sta_pha):
+    return os.path.join(sta_pha,f"{sta_pha}.journal")
+
+def read_journal(sta_pha):
+    """
+    Read the journal of one station-phase. The journal records
+        "base n": start of an incremental run over n old templates
+        "plan idx0 idx1 ... idxn": chunk boundaries of the run
+        "done point1 point2": one finished chunk
+        "complete n": all chunks of n templates finished
+    Return index_list (None if no plan), finished chunks {point1:point2},
+    the template quantity of the complete run (None if not complete) and the
+    base of the last run (0 for a full run)
+    """
+    index_list = None
+    done = {}
+    complete = None
+    base = 0
+    if not os.path.exists(journal_path(sta_pha)):
+        return index_list,done,complete,base
+    with open(journal_path(sta_pha),'r') as f:
+        for line in f:
+            tmp = line.split()
+            if len(tmp) == 0:
+                continue
+            if tmp[0] == "base":
+                base = int(tmp[1])
+                index_list,done,complete = None,{},None
+            elif tmp[0] == "plan":
+                index_list = [int(idx) for idx in tmp[1:]]
+                done = {}
+            elif tmp[0] == "done" and len(tmp) == 3:
+                done[int(tmp[1])] = int(tmp[2])
+            elif tmp[0] == "complete":
+                complete = int(tmp[1])
+    return index_list,done,complete,base
+
+def journal_write(f,line):
+    """
+    Append one record and force it onto disk
+    """
+    f.write(line+"\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def template_costs(neighbours,para):
+    """
+    Estimated cost of each template: the number of waveforms read and
+    correlated times the sliding window length in seconds. Templates without
+    target cost nothing.
+    """
+    win_len = para["te"]-para["tb"]+2*para["max_shift"]
+    return np.array([(len(nb)+1)*win_len if len(nb)>0 else 0 for nb in neighbours])
+
+def balance_chunks(costs,n_chunks):
+    """
+    Split templates into at most n_chunks contiguous groups of about equal
+    total cost. Return the boundary index list [0,...,len(costs)].
+    """
+    if len(costs) == 0:
+        return [0]
+    cum = np.cumsum(costs)
+    targets = cum[-1]*np.arange(1,n_chunks)/n_chunks
+    bounds = np.searchsorted(cum,targets,side="left")+1
+    index_list = np.unique(np.concatenate(([0],bounds,[len(costs)])))
+    return [int(idx) for idx in index_list]
+
+def scc_worker(worker_id,task_queue,done_queue):
+    """
+    Take tasks from the shared queue until a None is received. Report each
+    finished task and, at last, the busy time of this worker.
+    """
+    t_start = time.time()
+    busy = 0
+    count = 0
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        scc_func,task_args = task
+        t1 = time.time()
+        scc_func(*task_args)
+        busy += time.time()-t1
+        count += 1
+        done_queue.put(("done",worker_id,task_args[2],task_args[3]))
+    done_queue.put(("stat",worker_id,count,busy,time.time()-t_start))
+
+def run_tasks(scc_func,tasks,cores,journal=None):
+    """
+    Feed tasks to workers through a shared queue and return the worker
+    statistics {worker_id:[count,busy,wall]}. Finished chunks are recorded
+    in the journal file object if provided.
+    """
+    task_queue = mp.Queue()
+    done_queue = mp.Queue()
+    for task in tasks:
+        task_queue.put((scc_func,task))
+    for i in range(cores):
+        task_queue.put(None)
+    workers = []
+    for i in range(cores):
+        p = mp.Process(target=scc_worker,args=(i,task_queue,done_queue))
+        p.start()
+        workers.append(p)
+    finished = 0
+    stats = {}
+    while len(stats) < cores:
+        try:
+            msg = done_queue.get(timeout=1)
+        except queue.Empty:
+            for i,p in enumerate(workers):
+                if not p.is_alive() and i not in stats and done_queue.empty():
+                    raise Exception(f"Worker {i} exited with code {p.exitcode}")
+            continue
+        if msg[0] == "done":
+            if journal != None:
+                journal_write(journal,f"done {msg[2]} {msg[3]}")
+            finished += 1
+            print(f"Finished {finished}/{len(tasks)}",end = '\r')
+        else:
+            stats[msg[1]] = list(msg[2:])
+    for p in workers:
+        p.join()
+    print()
+    return stats
+
+def report_utilisation(stats):
+    """
+    Print per-worker utilisation, i.e. busy time over wall time
+    """
+    wall = max([stats[i][2] for i in stats])
+    utils = []
+    for i in sorted(stats):
+        count,busy,_ = stats[i]
+        util = busy/wall if wall>0 else 1
+        utils.append(util)
+        print(f"Worker {format(i,'3d')}: {format(count,'4d')} chunks, busy {format(busy,'9.1f')} s, utilisation {format(util*100,'5.1f')}%")
+    return utils
+
+def mp_scc(args,sta_pha,sum_rev_dict,resume=False,base=0):
     '''
     The calculation proess is:
         -- The first waveform cross-correlate with left n-1 waveforms
         -- The i-th waeform cross-correlate with left n-j waveforms
     The multiprocessing solution is dividing the whole process into sub-process:
-        -- The 1st-200th templates round as one group
-        -- The 200th-450th templates round as the second group
-        -- The gap increases to maintain general equivalent computation time 
+        -- The cost of a template is estimated by its neighbour quantity and
+           the sliding window length
+        -- Templates are split into contiguous chunks of equal cost, 
+           chunks_per_core chunks for each core
+        -- Chunks are fed to workers through a shared queue, the most
+           expensive first
+    Results of each chunk are saved in the binary store {sta_pha}.{point1}.npz
+    (see seisloc.scc.SccStore), *.xc text files are written if args.write_xc.
+    Each finished chunk is recorded in {sta_pha}/{sta_pha}.journal. With
+    resume=True, the chunk plan of the journal is reused and only chunks
+    not recorded as done are computed.
+    With base>0 (incremental run), the first base lines are taken as old
+    templates already correlated with each other, only pairs involving at
+    least one line after base are computed.
+    Return the utilisation of each worker
     '''
-    s_point = 0          # Start from the first event
-    content = []
-    with open(os.path.join(args.af_folder,f"{sta_pha}.arr"),'r') as f:
-        for line in f:
-            line = line.rstrip()
-            content.append(line)
-    f.close()
-    total_amount = len(content)
-    gap = 200                      # Will increase in further group
-    index_list = [s_point]         # Initiate the list
-    loop_j = s_point+gap           # The loop parameter
-    while loop_j < total_amount:
-        index_list.append(loop_j)
-        gap = gap + 50
-        loop_j += gap
-    index_list.append(total_amount)# Append the end value
+    content = read_arr(args,sta_pha)
+    neighbours = build_neighbours(content,sum_rev_dict,args.max_sep)
+    evids = read_evids(content,sum_rev_dict)
+    if sta_pha[-1]=="S":
+        para = parse_scc_cmd(args.S_scc)
+    if sta_pha[-1]=="P":
+        para = parse_scc_cmd(args.P_scc)
+    cores = args.cpu_cores
+    if cores==0:
+        cores = mp.cpu_count()
+    index_list,done,complete = None,{},None
+    if resume:
+        index_list,done,complete,base = read_journal(sta_pha)
+    if base > 0:
+        neighbours = [nb[nb>=base] for nb in neighbours] # Old pairs are skipped
+    costs = template_costs(neighbours,para)
+    if args.wf_bank and args.engine != "c":
+        prepare_bank(args,sta_pha,para,evids)
+    if index_list != None and index_list[-1] != len(content):
+        print(f"Journal of {sta_pha} covers {index_list[-1]} templates while {len(content)} provided, restart")
+        index_list,done = None,{}
+        remove_chunks(sta_pha,base)
+    if index_list == None:
+        index_list = balance_chunks(costs,cores*args.chunks_per_core)
+        with open(journal_path(sta_pha),'a') as journal:
+            if base > 0:
+                journal_write(journal,f"base {base}")
+            journal_write(journal,"plan "+" ".join([str(idx) for idx in index_list]))
+    elif len(done)>0:
+        print(f"Resume {sta_pha}: {len(done)}/{len(index_list)-1} chunks finished before")
     tasks=[]
+    chunk_costs = []
+    if args.engine == "c":
+        scc_func = scc_c
+    else:
+        scc_func = scc_py
 
     for i in range(len(index_list)-1):
         point1 = index_list[i]
         point2 = index_list[i+1]
-        tasks.append((args,sta_pha,point1,point2))
-        scc_c(args,sta_pha,point1,point2)
-    '''
-    # Multiprocessing
-    cores = args.cpu_cores
-    if cores==0:
-        cores = mp.cpu_count()
-    pool = mp.Pool(processes=cores)
-    rs = pool.starmap_async(scc_c,tasks,chunksize=1)
-    pool.close()
-    while(True):
-        remaining = rs._number_left
-        print(f"Finished {len(tasks)-remaining}/{len(tasks)}",end = '\r')
-        if(rs.ready()):
-            break
-        time.sleep(0.5)
-   '''
+        if done.get(point1) == point2 or np.sum(costs[point1:point2]) == 0:
+            continue
+        tasks.append((args,sta_pha,point1,point2,neighbours[point1:point2],evids,base))
+        chunk_costs.append(np.sum(costs[point1:point2]))
+    tasks = [tasks[k] for k in np.argsort(chunk_costs)[::-1]]
+    utils = []
+    with open(journal_path(sta_pha),'a') as journal:
+        if len(tasks) > 0:
+            stats = run_tasks(scc_func,tasks,min(cores,len(tasks)),journal=journal)
+            utils = report_utilisation(stats)
+        journal_write(journal,f"complete {len(content)}")
+    return utils
+
 if __name__ == "__main__":
     """
     Description:
@@ -161,9 +528,16 @@ if __name__ == "__main__":
         --af_folder="./"
         --P_scc="scc -C0.6 -M3 -W-0.5/1/0.75
         --S_scc="scc -C0.6 -M3 -W-1/3/2"
+        --engine="python"
+    Add --resume to continue an interrupted run without recomputing
+    finished chunks.
+    Add --incremental after appending new events to the arrival files
+    (seisloc.scc.gen_scc_input(...,incremental=True)), only pairs with new
+    events are correlated.
     The program recognize "*.arr" as arrival files
     """
     args = read_args()
+    sum_rev_dict = load_sum_rev(args.sum_file) # Read in event information
     sta_pha_list = []                        # List for sta_pha
     for file in os.listdir(args.af_folder):
         if file[-3:]!="arr":                 # Pass non-arrival files
@@ -171,11 +545,29 @@ if __name__ == "__main__":
         sta_pha = re.split("\.",file)[0]     # E.g. sta_pha = GS010_P
         sta_pha_list.append(sta_pha)
     for sta_pha in sta_pha_list:
-        if os.path.exists(sta_pha):
-            shutil.rmtree(sta_pha)
-        os.makedirs(sta_pha)                 # Error happens when exists
-        mp_scc(args,sta_pha)
+        base = 0
+        if (args.resume or args.incremental) and os.path.exists(journal_path(sta_pha)):
+            complete = read_journal(sta_pha)[2]
+            n_line = len(read_arr(args,sta_pha))
+            if complete == n_line:
+                print(f"{sta_pha} completed before, skip")
+                continue
+            if args.incremental and complete != None:
+                if complete > n_line:
+                    raise Exception(f"{sta_pha}: {n_line} lines provided, less than {complete} of the last run")
+                base = complete               # Lines after base are new events
+            elif not args.resume:
+                print(f"Last run of {sta_pha} was interrupted, add --resume to continue it")
+                continue
+        else:
+            if os.path.exists(sta_pha):
+                shutil.rmtree(sta_pha)
+            os.makedirs(sta_pha)             # Error happens when exists
+        utils = mp_scc(args,sta_pha,sum_rev_dict,resume=args.resume and base==0,base=base)
         finish_time = UTCDateTime.now()
         with open("mp_scc.log",'a') as f:
-            f.write(str(finish_time)+" "+sta_pha+"\n")
+            f.write(str(finish_time)+" "+sta_pha)
+            if len(utils)>0:
+                f.write(f" utilisation min {format(min(utils)*100,'5.1f')}% mean {format(np.mean(utils)*100,'5.1f')}%")
+            f.write("\n")
         f.close()
@@ -1,17 +1,111 @@
 import os
 import copy
+import shutil
 import numpy as np
 from PIL import Image
 import matplotlib.pyplot as plt
 from obspy import UTCDateTime
 from obspy.geodetics import gps2dist_azimuth
-from seisloc.dd import loadDD
-from seisloc.geometry import in_rectangle,loc_by_width
+from seisloc.dd import read_reloc,reloc_times_ns
+from seisloc.geometry import loc_by_width,vincenty,SpatialIndex
 from math import floor,ceil
 
+def epoch(t):
+    """
+    Epoch seconds of UTCDateTime or number
+    """
+    if isinstance(t,UTCDateTime):
+        return t.timestamp
+    return float(t)
+
+def range_mask(values,bounds):
+    """
+    Boolean mask of bounds[0] <= values <= bounds[1], a bound of None is
+    not applied
+    """
+    mask = np.ones(len(values),dtype=bool)
+    if bounds[0] is not None:
+        mask &= values>=bounds[0]
+    if bounds[1] is not None:
+        mask &= values<=bounds[1]
+    return mask
+
+def where_idxs(locs,times,idxs=None,lon=None,lat=None,dep=None,mag=None,time=None):
+    """
+    Indexes of events meeting all the range conditions, e.g. lon=[104,105],
+    mag=[2,None], time=[UTCDateTime(2019,3,1),None]. idxs limits the search
+    to these indexes, None for all events.
+    """
+    if idxs is None:
+        idxs = np.arange(len(times))
+    for col,bounds in enumerate([lon,lat,dep,mag]):
+        if bounds is not None:
+            idxs = idxs[range_mask(locs[idxs,col],bounds)]
+    if time is not None:
+        bounds = [None if t is None else epoch(t) for t in time]
+        idxs = idxs[range_mask(times[idxs],bounds)]
+    return idxs
+
+class CatalogView():
+    def __init__(self,cata,idxs):
+        """
+        Events of a Catalog selected by Catalog.where. The view keeps the
+        arrays of the catalog at creation and an index array into them,
+        no event data is copied. Later selections on the catalog replace
+        its arrays and do not affect the view.
+
+        >>> view = cata.where(lon=[104,104.5],mag=[1,None])
+        >>> view = view.where(time=[UTCDateTime(2019,3,1),UTCDateTime(2019,4,1)])
+        >>> len(view)                # quantity of selected events
+        >>> sub = view.to_catalog()  # new Catalog with only the selected events
+        """
+        self.cata = cata
+        self.idxs = idxs
+        self._keys = cata.keys
+        self._locs = cata.locs
+        self._times = cata.times
+
+    def where(self,lon=None,lat=None,dep=None,mag=None,time=None):
+        """
+        Further selection on this view, see Catalog.where
+        """
+        idxs = where_idxs(self._locs,self._times,self.idxs,lon,lat,dep,mag,time)
+        view = copy.copy(self)
+        view.idxs = idxs
+        return view
+
+    @property
+    def keys(self):
+        return self._keys[self.idxs]
+
+    @property
+    def locs(self):
+        return self._locs[self.idxs]
+
+    @property
+    def times(self):
+        return self._times[self.idxs]
+
+    def to_catalog(self):
+        """
+        Materialize the view as a new Catalog, reference time of relative
+        seconds is kept from the parent catalog
+        """
+        cata = copy.copy(self.cata)
+        cata.keys = self.keys
+        cata.locs = self.locs
+        cata.times = self.times
+        cata.update_dict()
+        return cata
+
+    def __len__(self):
+        return len(self.idxs)
+
+    def __repr__(self):
+        return f"View of {len(self.idxs)} events in a catalog of {len(self._keys)} events"
 
 class Catalog():
-    def __init__(self,locfile="hypoDD.reloc"):
+    def __init__(self,locfile="hypoDD.reloc",cache=True):
         """
         The programme will read in hypoDD relocation file by default. If no hypoDD
         file provided (locfile=None), it will generate an empty catalog. 
@@ -22,59 +116,142 @@ class Catalog():
         >>> cata.dict = cata_dict  # cata_dict is a dictionary follows above format
         >>> cata.init()            # initiation of the class
         >>> print(cata)            # basic information will be printed
-        """
+        The parsed locfile is cached on disk if cache is True, see
+        seisloc.dd.read_reloc.
+
+        Events are saved in arrays of the same order:
+              keys: int64 event ids
+              locs: float64 array of lon, lat, dep, mag in columns
+             times: float64 origin times in epoch seconds
+        Selections (crop, magsel, trim, ...) are boolean masks over these
+        arrays, Catalog.where gives selections without copy. The dict is
+        only built when it is accessed, UTCDateTime is only used for input
+        and output times.
+
+        Spatial queries go through self.spatial_index, e.g.
+        >>> idxs = cata.spatial_index.radius(104.5,29.5,2)
+        >>> cata.select(idxs)
+        """
+        self.keys = np.zeros(0,dtype=np.int64)
+        self.locs = np.zeros((0,4),dtype=np.float64)
+        self.times = np.zeros(0,dtype=np.float64)
+        self.first_key = None
+        self.first_time = None
+        self._sindex = None
         if locfile != None:
             if not os.path.exists(locfile):
                 raise Exception(f"{locfile} not existed!")
-            self.dict,_ = loadDD(locfile)
+            dataset,_ = read_reloc(locfile,cache=cache)
+            self.keys = dataset[:,0].astype(np.int64)
+            self.locs = np.ascontiguousarray(dataset[:,[2,1,3,16]])
+            self.times = reloc_times_ns(dataset)/1e9
+            self.dict = None
             print("successfully load catalog file: "+locfile)
-            self.init()
+            self.init_relative_seconds()
         else:
             print("No hypoDD data provided, an empty Catalog created.")
             print("You can define self.dict[evid] = [lon,lat,dep,mag,UTCDateTime]}")
             print("Then run: .init() to initiate the catalog.")
             self.dict = {}
 
+    @property
+    def dict(self):
+        """
+        dict[evid] = [lon,lat,dep,mag,UTCDateTime], built from the arrays
+        on first access after a change of the catalog
+        """
+        if self._dict == None:
+            self._dict = {}
+            for key,loc,etime in zip(self.keys.tolist(),self.locs.tolist(),self.times):
+                self._dict[key] = loc+[UTCDateTime(etime)]
+        return self._dict
+
+    @dict.setter
+    def dict(self,eve_dict):
+        self._dict = eve_dict
+
     def init(self):
         """
-        Initiate the catalog
+        Initiate the catalog arrays from self.dict
         """
         self.init_keys()
         self.init_locs()
+        self.init_times()
         self.init_relative_seconds()
 
     def init_keys(self):
         """
         Build up event ids array
         """
-        self.keys = list(self.dict.keys())
-        self.keys = np.array(self.keys)
-        self.keys = self.keys.astype(int)
+        self.keys = np.array(list(self.dict.keys()),dtype=np.int64)
 
     def init_locs(self):
         """
         Generate numpy array in format lon, lat, dep, mag
         """
-        self.locs = []
-        for key in self.keys:
-            lon = self.dict[key][0]
-            lat = self.dict[key][1]
-            dep = self.dict[key][2]
-            mag = self.dict[key][3]
-            self.locs.append([lon,lat,dep,mag])
-        self.locs = np.array(self.locs)
+        self.locs = np.array([self.dict[key][:4] for key in self.keys.tolist()],dtype=np.float64)
+        self.locs = self.locs.reshape(-1,4)
+
+    def init_times(self):
+        """
+        Origin times in epoch seconds
+        """
+        self.times = np.array([self.dict[key][4].timestamp for key in self.keys.tolist()],dtype=np.float64)
 
     def init_relative_seconds(self):
         """
-        Numpy array to save relative seconds to the first event
+        Take the first event as the reference of relative seconds
         """
+        if len(self.keys) == 0:
+            self.first_key = None
+            self.first_time = None
+            return
         self.first_key = self.keys[0]
-        self.first_time = self.dict[self.first_key][4]
-        self.relative_seconds = []
-        for key in self.keys:
-            etime = self.dict[key][4]
-            self.relative_seconds.append(etime-self.first_time)
-        self.relative_seconds = np.array(self.relative_seconds)
+        self.first_time = UTCDateTime(self.times[0])
+
+    @property
+    def relative_seconds(self):
+        """
+        Origin times in seconds relative to self.first_time
+        """
+        return self.times - self.first_time.timestamp
+
+    @property
+    def spatial_index(self):
+        """
+        seisloc.geometry.SpatialIndex of event locations, built on first
+        use and rebuilt after self.locs is replaced (selections, init,
+        merge). Change of locs values in place is not tracked.
+        """
+        if self._sindex == None or self._sindex[0] is not self.locs:
+            self._sindex = [self.locs,SpatialIndex(self.locs[:,0],self.locs[:,1],self.locs[:,2])]
+        return self._sindex[1]
+
+    @property
+    def lons(self):
+        return self.locs[:,0]
+
+    @property
+    def lats(self):
+        return self.locs[:,1]
+
+    @property
+    def deps(self):
+        return self.locs[:,2]
+
+    @property
+    def mags(self):
+        return self.locs[:,3]
+
+    def select(self,idxs):
+        """
+        Keep events by a boolean mask or an index array over the events,
+        index array also sets the order of events
+        """
+        self.update_keys(idxs)
+        self.update_locs(idxs)
+        self.update_relative_seconds(idxs)
+        self.update_dict()
 
     def update_keys(self,idxs):
         """
@@ -84,12 +261,9 @@ class Catalog():
 
     def update_dict(self):
         """
-        Update dictionary with new set of keys
+        Drop the dict, it will be rebuilt from arrays on next access
         """
-        old_keys = list(self.dict.keys())
-        for key in old_keys:
-            if key not in self.keys:
-                self.dict.pop(key)
+        self._dict = None
 
     def update_locs(self,idxs):
         """
@@ -99,51 +273,51 @@ class Catalog():
 
     def update_relative_seconds(self,idxs):
         """
-        Update relative times with indexs
+        Update origin times with indexs
         """
-        self.relative_seconds = self.relative_seconds[idxs]
+        self.times = self.times[idxs]
         
     def crop(self,lonmin,lonmax,latmin,latmax):
         """
         Trim the dataset with the lon-lat boundary conditions
         """
-        idxs = np.where((self.locs[:,0]>=lonmin)&(self.locs[:,0]<=lonmax)&\
-                        (self.locs[:,1]>=latmin)&(self.locs[:,1]<=latmax))
-        self.update_keys(idxs)
-        self.update_dict()
-        self.update_locs(idxs)
-        self.update_relative_seconds(idxs)
+        mask = (self.locs[:,0]>=lonmin)&(self.locs[:,0]<=lonmax)&\
+               (self.locs[:,1]>=latmin)&(self.locs[:,1]<=latmax)
+        self.select(mask)
 
     def magsel(self,mag_low,mag_top=10):
         """
         Select the dataset with the magnitude
         """
-        idxs = np.where((self.locs[:,3]>=mag_low)&(self.locs[:,3]<=mag_top))
-        self.update_keys(idxs)
-        self.update_dict()
-        self.update_locs(idxs)
-        self.update_relative_seconds(idxs)
+        mask = (self.locs[:,3]>=mag_low)&(self.locs[:,3]<=mag_top)
+        self.select(mask)
 
     def trim(self,starttime,endtime):
         """
         Trim the dataset with time conditions
         """
-        min_reftime = starttime - self.first_time
-        max_reftime = endtime - self.first_time
-        
-        idxs = np.where((self.relative_seconds>=min_reftime)&\
-                        (self.relative_seconds<=max_reftime))
-        self.update_keys(idxs)
-        self.update_dict()
-        self.update_locs(idxs)
-        self.update_relative_seconds(idxs)
+        mask = (self.times>=starttime.timestamp)&(self.times<=endtime.timestamp)
+        self.select(mask)
 
     def sort(self,method="time"):
-        idxs = self.relative_seconds.argsort()
-        self.update_keys(idxs)
-        self.update_dict()
-        self.update_locs(idxs)
-        self.update_relative_seconds(idxs)
+        idxs = self.times.argsort()
+        self.select(idxs)
+
+    def where(self,lon=None,lat=None,dep=None,mag=None,time=None):
+        """
+        Select events by ranges without changing the catalog, return a
+        CatalogView sharing the arrays of the catalog. Ranges are [min,max]
+        with bounds included, None for no bound.
+
+        Parameters
+        -----------
+        lon,lat: longitude and latitude range in degree
+            dep: depth range in km
+            mag: magnitude range
+           time: origin time range in UTCDateTime or epoch seconds
+        """
+        idxs = where_idxs(self.locs,self.times,None,lon,lat,dep,mag,time)
+        return CatalogView(self,idxs)
 
     def hplot(self,
               xlim=[],
@@ -188,19 +362,15 @@ class Catalog():
             plt.figure(figsize=figsize)
 
         if section_width <=0:
-            raise Error("Width <= 0")
+            raise Exception("section_width <= 0")
         # plot all events
         if add_section==True:
             alon = alonlat[0]; alat = alonlat[1]
             blon = blonlat[0]; blat = blonlat[1]
             print(alon,alat,blon,blat,section_width)
-            results = in_rectangle(self.locs,alon,alat,blon,blat,section_width/2)
-            jj = np.where(results[:,0]==1)
             if crop == True:
-                self.update_keys(jj)
-                self.update_relative_seconds(jj)
-                self.update_locs(jj)
-                self.update_dict()
+                jj,_ = self.spatial_index.rectangle(alon,alat,blon,blat,section_width/2)
+                self.select(jj)
                 
         if cmap == None:
             plt.scatter(self.locs[:,0],
@@ -211,8 +381,7 @@ class Catalog():
                     marker='o',
                     alpha=1)
         else:
-            shift_seconds = ref_time - self.first_time
-            times_plot = self.relative_seconds-shift_seconds
+            times_plot = self.times-ref_time.timestamp
             if unit=="day":
                 times_plot = times_plot/(24*60*60)
             elif unit=="hour":
@@ -308,30 +477,27 @@ class Catalog():
         length_km = length_m/1000
         alon = alonlat[0]; alat = alonlat[1]
         blon = blonlat[0]; blat = blonlat[1]
-        results = in_rectangle(self.locs,alon,alat,blon,blat,width/2)
-        jj = np.where(results[:,0]>0)
-        self.vxy=np.zeros((jj[0].shape[-1],2))
-        self.vkeys=np.zeros((jj[0].shape[-1],))
-        self.vkeys = self.keys[jj].ravel()
-        self.vxy[:,0] = results[jj,1]
+        jj,dists = self.spatial_index.rectangle(alon,alat,blon,blat,width/2)
+        self.vxy=np.zeros((len(jj),2))
+        self.vkeys = self.keys[jj]
+        self.vxy[:,0] = dists
         self.vxy[:,1] = self.locs[jj,2]
         if cmap==None:
-            plt.scatter(results[jj,1],
+            plt.scatter(dists,
                     self.locs[jj,2],
                     marker='o',
                     edgecolors = edgecolor,
                     facecolors='none',
                     s=(self.locs[jj,3]+2)*size_ratio*5)
         else:
-            shift_seconds = ref_time - self.first_time
-            times_plot = self.relative_seconds[jj]-shift_seconds
+            times_plot = self.times[jj]-ref_time.timestamp
             if unit=="day":
                 times_plot = times_plot/(24*60*60)
             elif unit=="hour":
                 times_plot = times_plot/(60*60)
             elif unit=="minute":
                 times_plot = times_plot/60
-            im = plt.scatter(results[jj,1],
+            im = plt.scatter(dists,
                     self.locs[jj,2],
                     c=times_plot,
                     s=(self.locs[jj,3]+2)*size_ratio*5,
@@ -344,11 +510,10 @@ class Catalog():
             cb.set_label(unit)
 
         tmplocs = self.locs[jj]
-        tmpresults = results[jj]
         if imp_mag != None:
             kk = np.where(tmplocs[:,3]>=imp_mag)
             if len(kk)>0:                 
-                imp = plt.scatter(tmpresults[kk,1],
+                imp = plt.scatter(dists[kk],
                         tmplocs[kk,2],
                         (tmplocs[kk,3]+2)*size_ratio*30,
                         edgecolors ='black',
@@ -386,11 +551,8 @@ class Catalog():
             denominator = 1
             plt.xlabel("Time (second)")
         
-        for key in self.keys:
-            etime = self.dict[key][4]
-            emag = self.dict[key][3]
-            diff_seconds = etime - ref_time
-            diff_x = diff_seconds/denominator
+        diff_xs = (self.times-ref_time.timestamp)/denominator
+        for diff_x,emag in zip(diff_xs,self.locs[:,3]):
             if cmap == None:
                 plt.plot([diff_x,diff_x],[ylim[0],emag],c='grey')
             else:
@@ -433,19 +595,14 @@ class Catalog():
         axs[0].grid(axis="y")
         axs[1].grid(axis="y")
         if refid != None:
-            reflon = self.dict[refid][0]
-            reflat = self.dict[refid][1]
-            refdep = self.dict[refid][2]
+            reflon,reflat,refdep = self[refid][:3]
         if len(refloc)>0:
             reflon,reflat,refdep = refloc
-        for evid in self.keys:
-            etime =self.dict[evid][4]
-            elon = self.dict[evid][0]
-            elat = self.dict[evid][1]
-            edep = self.dict[evid][2]
-            emag = self.dict[evid][3]
-            diff_x = (etime-ref_time)/denominator
-            dist,_,_ = gps2dist_azimuth(elat,elon,reflat,reflon)
+        dists,_,_ = vincenty(self.locs[:,1],self.locs[:,0],reflat,reflon)
+        diff_xs = (self.times-ref_time.timestamp)/denominator
+        for i,dist in enumerate(np.atleast_1d(dists)):
+            elon,elat,edep,emag = self.locs[i]
+            diff_x = diff_xs[i]
             d3dist = np.sqrt((dist/1000)**2+(edep-refdep)**2)
             if cmap==None:
                 axs[0].scatter(diff_x,edep,s=(emag+2)*5,marker='o',c='k')
@@ -475,14 +632,10 @@ class Catalog():
         Parameters:
             -ref_time: Reference time for plot
         """
-        ref_list = []
-        time_list = []
-        for key in self.dict.keys():
-            _,_,_,_,etime = self.dict[key]
-            ref_list.append((etime-ref_time)/(24*60*60))
+        ref_list = (self.times-ref_time.timestamp)/(24*60*60)
 
-        min_day=floor(min(ref_list))
-        max_day=ceil(max(ref_list))
+        min_day=floor(np.min(ref_list))
+        max_day=ceil(np.max(ref_list))
         bins = np.linspace(min_day,max_day,max_day-min_day+1)
         if figsize==None:
             figsize=(8,4)
@@ -541,18 +694,11 @@ class Catalog():
         if refid==None and refloc==[]:
             raise Exception("refid or refloc should be proivded")
         if refloc==[]:
-            refloc=[self.dict[refid][0],self.dict[refid][1]]
-        dist_list = np.zeros((len(self.keys),1))
-        day_list = np.zeros((len(self.keys),1))
-        mag_list = np.zeros((len(self.keys),1))
-        for i in range(len(self.keys)):
-            dist,_,_ = gps2dist_azimuth(self.locs[i,1],\
-                                self.locs[i,0],\
-                                refloc[1],\
-                                refloc[0])
-            day_list[i,0] = (self.relative_seconds[i]-np.min(self.relative_seconds))/(24*60*60)
-            mag_list[i,0] = self.locs[i,3]
-            dist_list[i,0] = dist
+            refloc=self[refid][:2]
+        dists,_,_ = vincenty(self.locs[:,1],self.locs[:,0],refloc[1],refloc[0])
+        dist_list = np.reshape(dists,(-1,1))
+        day_list = ((self.times-np.min(self.times))/(24*60*60)).reshape(-1,1)
+        mag_list = self.locs[:,3].reshape(-1,1)
 
         fig1 = plt.figure(1)
         ax1 = plt.subplot(1,1,1)
@@ -613,14 +759,16 @@ class Catalog():
             xlim = [np.min(self.locs[:,0]),np.max(self.locs[:,0])]
         if ylim == []:
             ylim = [np.min(self.locs[:,1]),np.max(self.locs[:,1])]    
-        min_time = self.first_time+np.min(self.relative_seconds)
-        max_time = self.first_time+np.max(self.relative_seconds)
+        min_time = np.min(self.times)
+        max_time = np.max(self.times)
         if mb_time == None:
-            mb_time = min_time
+            mb_time = UTCDateTime(min_time)
         if me_time == None:
-            me_time = max_time
+            me_time = UTCDateTime(max_time)
         print("Movie start time is: ",mb_time)
         print("  Movie end time is: ",me_time)
+        mb_time = mb_time.timestamp
+        me_time = me_time.timestamp
 
         if vmin == None:
             vmin = 0
@@ -638,7 +786,7 @@ class Catalog():
             ax1.set_ylim(ylim)
             ax1.set_xlabel("Lon(degree)",fontsize=18)
             ax1.set_ylabel("Lat(degree)",fontsize=18)
-            ax1.set_title(f"{str(loop_time)[:19]}",fontsize=16)
+            ax1.set_title(f"{str(UTCDateTime(loop_time))[:19]}",fontsize=16)
             if geopara != None:
                 # ----------------Molin faults--------------------------------
                 ml_fault = np.array(geopara.dict['ml_fault'])
@@ -662,15 +810,9 @@ class Catalog():
                 if len(sta_lons)>0:
                     s_sta=ax1.scatter(sta_lons,sta_lats,marker='^',c='cyan',s=120,edgecolor='k',label='Stations')
             #------------- Events -----------------------------------------
-            eve_arr = []
-            rela_days = []
-            for i,second in enumerate(self.relative_seconds):
-                e_time = self.first_time + second
-                if e_time<(loop_time+inc_second/2) and e_time>mb_time:
-                    eve_arr.append(self.locs[i,:4])
-                    rela_days.append((e_time-ref_time)/(24*60*60))
-            eve_arr = np.array(eve_arr)
-            rela_days = np.array(rela_days)
+            kk = (self.times<(loop_time+inc_second/2))&(self.times>mb_time)
+            eve_arr = self.locs[kk]
+            rela_days = (self.times[kk]-ref_time)/(24*60*60)
 
             if len(eve_arr)>0:
                 if cmap != None:
@@ -744,17 +886,32 @@ class Catalog():
         return axs
 
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Copy of the catalog arrays, the dict is rebuilt on access
+        """
+        new = copy.copy(self)
+        new.keys = self.keys.copy()
+        new.locs = self.locs.copy()
+        new.times = self.times.copy()
+        new.update_dict()
+        return new
+
     def merge(self,dd2):
-        for key in dd2.keys:
-            if key in self.keys:
-                raise Exception(f"Key error {key}. Please avoid using the same key value")
-            self.dict[key]=dd2.dict[key]
-        self.init()
+        dup = np.isin(dd2.keys,self.keys)
+        if np.any(dup):
+            raise Exception(f"Key error {dd2.keys[dup][0]}. Please avoid using the same key value")
+        self.keys = np.concatenate((self.keys,dd2.keys))
+        self.locs = np.concatenate((self.locs,dd2.locs))
+        self.times = np.concatenate((self.times,dd2.times))
+        self.update_dict()
+        self.init_relative_seconds()
+
+    def __len__(self):
+        return len(self.keys)
 
     def __repr__(self):
-        _qty = f"HypoDD relocation catalog with {len(self.dict.keys())} events\n"
-        _time= f"     Time range is: {self.first_time+np.min(self.relative_seconds)} to {self.first_time+np.max(self.relative_seconds)}\n"
+        _qty = f"HypoDD relocation catalog with {len(self.keys)} events\n"
+        _time= f"     Time range is: {UTCDateTime(np.min(self.times))} to {UTCDateTime(np.max(self.times))}\n"
         _mag = f" Magnitue range is: {format(np.min(self.locs[:,3]),'4.1f')} to {format(np.max(self.locs[:,3]),'4.1f')}\n"
         _lon = f"Longitude range is: {format(np.min(self.locs[:,0]),'8.3f')} to {format(np.max(self.locs[:,0]),'8.3f')}\n"
         _lat = f" Latitude range is: {format(np.min(self.locs[:,1]),'7.3f')} to {format(np.max(self.locs[:,1]),'7.3f')}\n"
@@ -762,4 +919,14 @@ class Catalog():
         return _qty+_time+_mag+_lon+_lat+_dep
     
     def __getitem__(self,key):
-        return self.dict[key]
+        """
+        [lon,lat,dep,mag,UTCDateTime] of event key, read from the arrays
+        when the dict is not built
+        """
+        if self._dict != None:
+            return self._dict[key]
+        idxs = np.where(self.keys==key)[0]
+        if len(idxs) == 0:
+            raise KeyError(key)
+        i = idxs[0]
+        return self.locs[i].tolist()+[UTCDateTime(self.times[i])]
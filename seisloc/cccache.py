@@ -0,0 +1,149 @@
+#-----------------------------------------------------------------------------
+#   Content-addressed cache of pairwise cross-correlation results.
+#   A result is keyed by the hash of the two waveform windows together with
+#   the parameters that change it (window, filter band, maximum shift, ...),
+#   so reruns with the same settings on unchanged waveforms are looked up
+#   instead of recomputed. Entries are kept in a sqlite file bounded by
+#   max_bytes, the least recently used ones are evicted first.
+#-----------------------------------------------------------------------------
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+
+def wf_hash(data):
+    """
+    Hash of waveform samples, the samples are taken as float32 so that the
+    same waveform read in different precision gives the same hash
+    """
+    data = np.ascontiguousarray(data,dtype=np.float32)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(data.shape).encode())
+    h.update(data.tobytes())
+    return h.hexdigest()
+
+def cc_key(hash1,hash2,**params):
+    """
+    Cache key of the correlation of two waveform windows, params are the
+    parameters of the correlation, e.g. tb=-0.5,te=1,max_shift=0.75,
+    band=(2,15). The order of params does not matter, numbers are compared
+    as float.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{hash1} {hash2}".encode())
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value,(int,float,np.number)):
+            value = float(value)
+        h.update(f" {name}={value!r}".encode())
+    return h.hexdigest()
+
+class CcCache():
+    def __init__(self,db_file="cc_cache.sqlite",max_bytes=2**30):
+        """
+        Disk cache of correlation results shared by processes.
+
+        Parameters
+        -----------
+          db_file: sqlite file, created if not exists
+        max_bytes: bound of the database size, least recently used entries
+                   are evicted to about 90% of it when exceeded
+
+        A value is a short float array, e.g. [cc,aa,shift] of the SCC or
+        [lag,cc] of eqcorr.
+        """
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(db_file) != "":
+            os.makedirs(os.path.dirname(db_file),exist_ok=True)
+        self.conn = sqlite3.connect(db_file,timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cc (key TEXT PRIMARY KEY,"
+                          " value BLOB, atime REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cc_atime ON cc(atime)")
+        self.conn.commit()
+
+    def get_many(self,keys):
+        """
+        Look up keys, return {key:value array} of the cached ones and mark
+        them as recently used
+        """
+        out = {}
+        keys = list(keys)
+        for c0 in range(0,len(keys),500):           # sqlite variable limit
+            chunk = keys[c0:c0+500]
+            marks = ",".join(["?"]*len(chunk))
+            for key,value in self.conn.execute(f"SELECT key,value FROM cc WHERE key IN ({marks})",chunk):
+                out[key] = np.frombuffer(value,dtype=np.float64)
+        if len(out) > 0:
+            now = time.time()
+            self.conn.executemany("UPDATE cc SET atime=? WHERE key=?",[(now,key) for key in out])
+            self.conn.commit()
+        self.hits += len(out)
+        self.misses += len(keys)-len(out)
+        return out
+
+    def get(self,key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self,items):
+        """
+        Store {key:value} or a list of [key,value], values are float arrays
+        """
+        if isinstance(items,dict):
+            items = items.items()
+        now = time.time()
+        rows = []
+        for key,value in items:
+            blob = np.asarray(value,dtype=np.float64).tobytes()
+            rows.append((key,blob,now))
+        if len(rows) == 0:
+            return
+        self.conn.executemany("INSERT OR REPLACE INTO cc VALUES (?,?,?)",rows)
+        self.conn.commit()
+        self.evict()
+
+    def put(self,key,value):
+        self.put_many([[key,value]])
+
+    def size(self):
+        """
+        Bytes used by the database pages, free pages excluded
+        """
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count-freelist_count)*page_size
+
+    def evict(self):
+        """
+        Remove least recently used entries until the size is below 90% of
+        max_bytes. The number to remove is estimated by the mean bytes of
+        one entry.
+        """
+        size = self.size()
+        if size <= self.max_bytes:
+            return
+        count = len(self)
+        if count == 0:
+            return
+        n = int(np.ceil((size-0.9*self.max_bytes)/(size/count)))
+        self.conn.execute("DELETE FROM cc WHERE key IN "
+                          "(SELECT key FROM cc ORDER BY atime LIMIT ?)",(n,))
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM cc")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cc").fetchone()[0]
+
+    def __repr__(self):
+        return f"Correlation cache {self.db_file}: {len(self)} entries, {self.size()} bytes, {self.hits} hits, {self.misses} misses"
@@ -14,6 +14,7 @@ from seisloc.geometry import in_rectangle,loc_by_width
 from math import ceil,floor
 import multiprocessing as mp
 import time
+import hashlib
 import subprocess
 import copy
 from PIL import Image
@@ -248,7 +249,94 @@ def hypoDD_mag_mapper(reloc_file,out_sum,magcolumn_index=128):
             f_obj.write(line)
     f_obj.close()
 
-def loadDD(reloc_file="hypoDD.reloc",shift_hour=0):
+def reloc_columns(ncol):
+    """
+    Column names of hypoDD.reloc, 25 columns with an additional "DAY" column
+    """
+    columns = ["ID","LAT","LON","DEPTH","X","Y","Z","EX","EY","EZ",\
+               "YR","MO","DY","HR","MI","SC","MAG",\
+               "NCCP","NCCS","NCTP","NCTS","RCC","RCT","CID"]
+    if ncol == 25:
+        columns.append("DAY")
+    return columns
+
+def reloc_times_ns(dataset,shift_hour=0):
+    """
+    Origin times of hypoDD.reloc rows in int64 nanoseconds since 1970-01-01,
+    computed from the YR,MO,DY,HR,MI,SC columns without UTCDateTime.
+    UTCDateTime(ns=value) gives the time of one event.
+    """
+    dataset = np.atleast_2d(dataset)
+    yrs = dataset[:,10].astype(np.int64)
+    mos = dataset[:,11].astype(np.int64)
+    dys = dataset[:,12].astype(np.int64)
+    months = (yrs-1970).astype("datetime64[Y]")+(mos-1).astype("timedelta64[M]")
+    days = months.astype("datetime64[D]").astype(np.int64)+dys-1
+    mins = (days*24+dataset[:,13].astype(np.int64))*60+dataset[:,14].astype(np.int64)
+    ns = mins*60*10**9 + np.round(dataset[:,15]*1e9).astype(np.int64)
+    return ns - int(round(shift_hour*50*60*1e9))
+
+# np.loadtxt is implemented in C since numpy 1.23, pandas is faster before
+_C_LOADTXT = tuple(int(v) for v in re.findall(r"\d+",np.__version__)[:2]) >= (1,23)
+RELOC_CACHE_DIR = os.path.join(os.path.expanduser("~"),".cache","seisloc","reloc")
+
+def parse_reloc(reloc_file="hypoDD.reloc"):
+    """
+    Parse the text of hypoDD.reloc into a float64 array
+    """
+    if os.path.getsize(reloc_file) == 0:
+        return np.zeros((0,24))
+    if _C_LOADTXT:
+        return np.loadtxt(reloc_file,ndmin=2)
+    df = pd.read_csv(reloc_file,sep=r"\s+",header=None,engine="c")
+    return df.to_numpy(dtype=np.float64)
+
+def reloc_cache_file(reloc_file,cache_dir=RELOC_CACHE_DIR):
+    """
+    Cache file of one hypoDD.reloc, named by the hash of its absolute path
+    """
+    path = os.path.abspath(reloc_file)
+    name = hashlib.blake2b(path.encode(),digest_size=16).hexdigest()
+    return os.path.join(cache_dir,name+".npz")
+
+def read_reloc(reloc_file="hypoDD.reloc",cache=True,cache_dir=RELOC_CACHE_DIR):
+    """
+    Read hypoDD.reloc into a float64 array, return dataset, columns
+
+    Parameters
+    -----------
+    reloc_file: hypoDD relocation file
+         cache: if True, the parsed array is kept in an npz file under
+                cache_dir and reused until the path, size or modification
+                time of reloc_file changes
+    """
+    if not cache:
+        dataset = parse_reloc(reloc_file)
+        return dataset,reloc_columns(dataset.shape[1])
+    path = os.path.abspath(reloc_file)
+    stat = os.stat(reloc_file)
+    cache_file = reloc_cache_file(reloc_file,cache_dir)
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as npz:
+                if str(npz["path"]) == path and \
+                   npz["stat"].tolist() == [stat.st_size,stat.st_mtime_ns]:
+                    dataset = npz["dataset"]
+                    return dataset,reloc_columns(dataset.shape[1])
+        except Exception:                          # broken cache, parse again
+            pass
+    dataset = parse_reloc(reloc_file)
+    try:
+        os.makedirs(cache_dir,exist_ok=True)
+        with open(cache_file+".tmp",'wb') as f:
+            np.savez(f,dataset=dataset,path=path,
+                     stat=np.array([stat.st_size,stat.st_mtime_ns],dtype=np.int64))
+        os.replace(cache_file+".tmp",cache_file)
+    except OSError as e:
+        print(f"Failed to write cache of {reloc_file}: {e}")
+    return dataset,reloc_columns(dataset.shape[1])
+
+def loadDD(reloc_file="hypoDD.reloc",shift_hour=0,cache=True):
     """
     load results of hypoDD
     return eve_dict, df
@@ -258,33 +346,18 @@ def loadDD(reloc_file="hypoDD.reloc",shift_hour=0):
     If the time of results is not in UTC time zone, a time shift might needed.
     For example, Beijing time zone is 8 hours early than UTC time, 8 hours 
     should be deducted so as to be consistent with UTC time.
+    The parsed file is cached on disk if cache is True, see read_reloc.
     """
-
+    dataset,columns = read_reloc(reloc_file,cache=cache)
+    times_ns = reloc_times_ns(dataset,shift_hour)
     eve_dict={}
-    columns = ["ID","LAT","LON","DEPTH","X","Y","Z","EX","EY","EZ",\
-           "YR","MO","DY","HR","MI","SC","MAG",\
-           "NCCP","NCCS","NCTP","NCTS","RCC","RCT","CID"]
-    number = 0
-
-    dataset = np.loadtxt(reloc_file)
-    
-    if dataset.shape[1] == 24:
-        columns = ["ID","LAT","LON","DEPTH","X","Y","Z","EX","EY","EZ",\
-                   "YR","MO","DY","HR","MI","SC","MAG",\
-                   "NCCP","NCCS","NCTP","NCTS","RCC","RCT","CID"]
-    if dataset.shape[1] == 25:
-        columns = ["ID","LAT","LON","DEPTH","X","Y","Z","EX","EY","EZ",\
-                   "YR","MO","DY","HR","MI","SC","MAG",\
-                   "NCCP","NCCS","NCTP","NCTS","RCC","RCT","CID","DAY"]
-    
-    for i,data in enumerate(dataset):
-        eve_id = data[0]
-        eve_lat = data[1]
-        eve_lon = data[2]
-        eve_dep = data[3]
-        eve_mag = data[16]
-        eve_time = UTCDateTime(int(data[10]),int(data[11]),int(data[12]),int(data[13]),int(data[14]),0)+data[15] - shift_hour*50*60
-        eve_dict[int(eve_id)]=[float(eve_lon),float(eve_lat),float(eve_dep),float(eve_mag),eve_time]
+    for eve_id,eve_lat,eve_lon,eve_dep,eve_mag,eve_ns in zip(dataset[:,0].astype(int).tolist(),
+                                                            dataset[:,1].tolist(),
+                                                            dataset[:,2].tolist(),
+                                                            dataset[:,3].tolist(),
+                                                            dataset[:,16].tolist(),
+                                                            times_ns.tolist()):
+        eve_dict[eve_id]=[eve_lon,eve_lat,eve_dep,eve_mag,UTCDateTime(ns=eve_ns)]
 
     df = pd.DataFrame(data=dataset,columns=columns)
     return eve_dict,df
@@ -0,0 +1,383 @@
+#-----------------------------------------------------------------------------
+#   Waveform cross-correlation of event pairs for the dt.cc file of hypoDD,
+#   the library version of demo/hypodd_input_py/eqcorr_hypodd.py.
+#   Results follow obspy.signal.cross_correlation.correlate (demean, naive
+#   normalization) and xcorr_max (absolute maximum).
+#-----------------------------------------------------------------------------
+import numpy as np
+import multiprocessing as mp
+from obspy import read,Stream,Trace
+from obspy.signal.cross_correlation import correlate,xcorr_max
+from tqdm import tqdm
+from seisloc.geometry import neighbour_pairs,vincenty
+from seisloc.cccache import wf_hash,cc_key
+
+def slice_index(starttime,sampling_rate,npts,t1s,t2s):
+    """
+    Sample index ranges of windows [t1,t2] in one trace, rounded to the
+    nearest sample as obspy Trace.slice does.
+
+    Parameters
+    -----------
+        starttime: trace starttime in nanoseconds (UTCDateTime._ns)
+    sampling_rate: sampling rate of the trace
+             npts: trace length
+          t1s,t2s: window start and end times in nanoseconds
+
+    Return
+    ----------
+    i1s,i2s, the window is data[i1:i2], empty if i2 <= i1
+    """
+    sec1 = (np.asarray(t1s,dtype=np.int64)-starttime)/1e9
+    sec2 = (np.asarray(t2s,dtype=np.int64)-starttime)/1e9
+    x1 = sec1*sampling_rate
+    x2 = sec2*sampling_rate
+    i1s = (np.sign(x1)*np.floor(np.abs(x1)+0.5)).astype(np.int64)  # round half away from zero
+    i2s = (np.sign(x2)*np.floor(np.abs(x2)+0.5)).astype(np.int64)+1
+    i1s[i1s<0] = 0
+    i2s[i2s>npts] = npts
+    i2s[sec1>(npts-1)/sampling_rate] = 0         # window starts after the trace
+    i2s[sec2<i1s/sampling_rate] = 0              # window ends before the first sample
+    return i1s,i2s
+
+def day_event_streams(task):
+    """
+    Cut event waveforms of one day. The day files are read once into a
+    station to traces dict, window indexes of all picks of one station are
+    computed together by slice_index and data are sliced as numpy arrays.
+    The output is the same as st.select(station=sta).slice(t1,t2) for each
+    pick.
+
+    Parameters
+    -----------
+    task: [day_files,events,time_before_arrival,time_after_arrival,
+           filter_kwargs,event_len]
+          day_files: continuous waveform files of the day
+             events: list of [event_id,origin_time,picks], picks is a list of
+                     [station,phase,pick time], times in UTCDateTime
+          filter_kwargs: kwargs of Stream.filter, None for no filtering
+          event_len: length of the event waveform after origin time
+
+    Return
+    ----------
+    list of [event_id,event stream,P stream,S stream] in the order of events
+    """
+    day_files,events,time_before_arrival,time_after_arrival,filter_kwargs,event_len = task
+    st = Stream()
+    for day_file in day_files:
+        try:
+            st += read(day_file)
+        except Exception as ex:
+            print(ex)
+    sta_traces = {}
+    if len(st) > 0:
+        st.detrend('linear')
+        if filter_kwargs is not None:
+            st.filter(**filter_kwargs)
+        for tr in st:
+            sta_traces.setdefault(tr.stats.station.upper(),[]).append(tr)
+
+    # windows of each station: [event index,stream (0 event,1 P,2 S),pick order,t1,t2]
+    windows = {}
+    for e,(event_id,origin_time,picks) in enumerate(events):
+        stas = set()
+        for p,(sta,phase,pick_time) in enumerate(picks):
+            sta = sta.upper()
+            if sta not in sta_traces:
+                continue
+            if sta not in stas:                  # duplicates are merged anyway
+                stas.add(sta)
+                windows.setdefault(sta,[]).append([e,0,p,origin_time._ns,(origin_time+event_len)._ns])
+            if phase == 'P':
+                k = 1
+            elif phase == 'S':
+                k = 2
+            else:
+                continue
+            windows[sta].append([e,k,p,(pick_time-time_before_arrival)._ns,
+                                       (pick_time+time_after_arrival)._ns])
+
+    pieces = [[[],[],[]] for _ in events]
+    for sta,ws in windows.items():
+        ws = np.array(ws,dtype=np.int64)
+        for n,tr in enumerate(sta_traces[sta]):
+            stats = tr.stats
+            i1s,i2s = slice_index(stats.starttime._ns,stats.sampling_rate,stats.npts,ws[:,3],ws[:,4])
+            for (e,k,p,_,_),i1,i2 in zip(ws,i1s,i2s):
+                if i2 <= i1:
+                    continue
+                header = {"network":stats.network,"station":stats.station,
+                          "location":stats.location,"channel":stats.channel,
+                          "sampling_rate":stats.sampling_rate,
+                          "starttime":stats.starttime+i1*stats.delta}
+                pieces[e][k].append([p,n,Trace(data=tr.data[i1:i2],header=header)])
+    results = []
+    for (event_id,_,_),event_pieces in zip(events,pieces):
+        streams = []
+        for k in range(3):
+            event_pieces[k].sort(key=lambda x:(x[0],x[1]))
+            streams.append(Stream([x[2] for x in event_pieces[k]]))
+        streams[0].merge()
+        results.append([event_id]+streams)
+    return results
+
+def extract_event_streams(day_tasks,cpu_cores=0,store=None):
+    """
+    Run day_event_streams for days in parallel, results are collected in
+    the order of day_tasks.
+
+    Parameters
+    -----------
+    day_tasks: list of tasks of day_event_streams
+    cpu_cores: 0 indicates using all cores
+        store: seisloc.wf.wfstore.WfStore opened in "a" mode, streams are
+               written into the store instead of kept in memory
+
+    Return
+    ----------
+    dicts {event_id:Stream} of event, P and S waveforms, None if store is
+    provided
+    """
+    event_stream = {}
+    event_stream_p = {}
+    event_stream_s = {}
+    if cpu_cores == 0:
+        cpu_cores = mp.cpu_count()
+    if cpu_cores == 1 or len(day_tasks) <= 1:
+        day_results = (day_event_streams(task) for task in day_tasks)
+        pool = None
+    else:
+        pool = mp.Pool(processes=min(cpu_cores,len(day_tasks)))
+        day_results = pool.imap(day_event_streams,day_tasks)
+    for results in tqdm(day_results,total=len(day_tasks)):
+        for event_id,st,st_p,st_s in results:
+            if store is not None:
+                store.add_stream(event_id,"all",st)
+                store.add_stream(event_id,"P",st_p)
+                store.add_stream(event_id,"S",st_s)
+                continue
+            event_stream[event_id] = st
+            event_stream_p[event_id] = st_p
+            event_stream_s[event_id] = st_s
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if store is not None:
+        return None
+    return event_stream,event_stream_p,event_stream_s
+
+def batch_correlate(datas,ii,jj,shift,pair_chunk=2000):
+    """
+    Correlate pairs of equal length traces by FFT, the same as
+    correlate(datas[i],datas[j],shift) followed by xcorr_max for each pair.
+
+    Parameters
+    -----------
+         datas: array in shape (trace quantity,npts)
+         ii,jj: index of the pairs
+         shift: maximum shift in samples, should be less than npts
+    pair_chunk: pairs computed together
+
+    Return
+    ----------
+    lags in samples and cc values at the absolute maximum
+    """
+    datas = np.asarray(datas,dtype=float)
+    datas = datas-np.mean(datas,axis=1,keepdims=True)
+    npts = datas.shape[1]
+    norms = np.sqrt(np.sum(datas*datas,axis=1))
+    nfft = 1<<int(np.ceil(np.log2(npts+shift)))
+    specs = np.fft.rfft(datas,nfft,axis=1)
+    lag_idx = np.r_[nfft-shift:nfft,0:shift+1]        # lags -shift ... shift
+    lags = np.zeros(len(ii),dtype=int)
+    values = np.zeros(len(ii))
+    for c0 in range(0,len(ii),pair_chunk):
+        i = ii[c0:c0+pair_chunk]
+        j = jj[c0:c0+pair_chunk]
+        cc = np.fft.irfft(specs[i]*np.conj(specs[j]),nfft,axis=1)[:,lag_idx]
+        norm = norms[i]*norms[j]
+        kk = norm > np.finfo(float).eps
+        cc[kk] /= norm[kk,None]
+        cc[~kk] = 0
+        imax = np.argmax(np.abs(cc),axis=1)
+        lags[c0:c0+pair_chunk] = imax-shift
+        values[c0:c0+pair_chunk] = cc[np.arange(len(i)),imax]
+    return lags,values
+
+def _station_correlate(task):
+    """
+    Correlate all pairs of one station-phase. Pairs of equal length traces
+    are computed by batch_correlate, others by obspy correlate.
+    """
+    datas,ii,jj,shift = task
+    lens = np.array([len(data) for data in datas])
+    lags = np.zeros(len(ii),dtype=int)
+    values = np.zeros(len(ii))
+    same = lens[ii] == lens[jj]
+    for npts in np.unique(lens[ii][same]):
+        k = np.flatnonzero(same&(lens[ii]==npts))
+        if shift > npts-1:                       # obspy pads zeros in this case
+            same[k] = False
+            continue
+        members = np.unique(np.concatenate((ii[k],jj[k])))
+        local = {m:n for n,m in enumerate(members)}
+        sub = np.array([datas[m] for m in members])
+        lags[k],values[k] = batch_correlate(sub,
+                                            np.array([local[m] for m in ii[k]]),
+                                            np.array([local[m] for m in jj[k]]),
+                                            shift)
+    for k in np.flatnonzero(~same):
+        cc = correlate(datas[ii[k]],datas[jj[k]],shift)
+        lags[k],values[k] = xcorr_max(cc)
+    return lags,values
+
+def correlate_event_pairs(event_list,event_lats,event_lons,event_stream_p,event_stream_s,
+                          event_id_mapper,max_sep=20,min_link=5,min_cc=0.5,max_shift=2,
+                          cpu_cores=0,cache=None,cache_params={}):
+    """
+    Cross-correlate P and S waveforms (Z component) of event pairs within
+    max_sep km. Pairs are preselected by a KD-tree and checked by the
+    geodesic distance (seisloc.geometry.vincenty), traces are grouped by
+    station and all pairs of one station-phase are correlated in one batch,
+    station-phases are distributed over a process pool.
+
+    Parameters
+    -----------
+                  event_list: list of event ids
+       event_lats,event_lons: dict {event id:latitude/longitude}
+    event_stream_p/_s: dict {event id:obspy Stream of P/S windows}
+             event_id_mapper: dict {event id:hypoDD event id}
+                     max_sep: maximum separation of events in km
+                    min_link: minimum links of a pair to be kept
+                      min_cc: minimum cc of a link
+                   max_shift: maximum shift in seconds
+                   cpu_cores: 0 indicates using all cores
+                       cache: seisloc.cccache.CcCache, pairs of unchanged
+                              traces are read from it instead of correlated
+                cache_params: extra key parameters of the cache, e.g. the
+                              filter band and the window
+
+    Return
+    ----------
+    event_pair_id: {pair id:[event id 1,event id 2,hypoDD id 1,hypoDD id 2]}
+    event_pair_cc: {pair id:[[station,dt,cc,phase],...]}, empty list if
+                   links are less than min_link
+    """
+    lons = np.array([event_lons[e] for e in event_list])
+    lats = np.array([event_lats[e] for e in event_list])
+    # Candidates by the straight-line distance in the KD-tree, which is never
+    # longer than the geodesic one, then the geodesic distance is checked as
+    # gps2dist_azimuth
+    ii,jj = neighbour_pairs(lons,lats,max_sep)
+    dists,_,_ = vincenty(lats[ii],lons[ii],lats[jj],lons[jj])
+    k = dists/1000 <= max_sep
+    ii = ii[k]; jj = jj[k]
+    print(f">>> {len(ii)} event pairs within {max_sep} km")
+    tasks = []
+    task_info = []
+    for pha,event_stream in [["P",event_stream_p],["S",event_stream_s]]:
+        sta_traces = {}                          # {station:{event index:trace}}
+        sta_rank = {}                            # {event index:{station:order}}
+        for e,event_id in enumerate(event_list):
+            sta_rank[e] = {}
+            if event_id not in event_stream:
+                continue
+            for tr in event_stream[event_id].select(component="*Z"):
+                sta = tr.stats.station
+                if sta in sta_rank[e]:           # the first trace of a station
+                    continue
+                sta_rank[e][sta] = len(sta_rank[e])
+                sta_traces.setdefault(sta,{})[e] = tr
+        for sta,traces in sta_traces.items():
+            has = np.zeros(len(event_list),dtype=bool)
+            has[list(traces.keys())] = True
+            k = np.flatnonzero(has[ii]&has[jj])
+            if len(k) == 0:
+                continue
+            members = np.unique(np.concatenate((ii[k],jj[k])))
+            local = {m:n for n,m in enumerate(members)}
+            datas = [traces[m].data for m in members]
+            sampling_rate = traces[members[0]].stats.sampling_rate
+            shift = int(sampling_rate*max_shift)
+            ii_local = np.array([local[m] for m in ii[k]])
+            jj_local = np.array([local[m] for m in jj[k]])
+            cached = None
+            if cache is not None:
+                hashes = [wf_hash(data) for data in datas]
+                keys = [cc_key(hashes[a],hashes[b],shift=shift,**cache_params)
+                                                    for a,b in zip(ii_local,jj_local)]
+                values = cache.get_many(keys)
+                hit = np.array([key in values for key in keys])
+                cached = [keys,hit,np.array([values[key] for key in keys if key in values]).reshape(-1,2)]
+                ii_local = ii_local[~hit]
+                jj_local = jj_local[~hit]
+                if len(ii_local) == 0:
+                    datas = []
+            tasks.append((datas,ii_local,jj_local,shift))
+            ranks = np.array([sta_rank[e][sta] for e in ii[k]])
+            task_info.append([k,sta,pha,sampling_rate,ranks,cached])
+    if cpu_cores == 0:
+        cpu_cores = mp.cpu_count()
+    if cpu_cores == 1 or len(tasks) <= 1:
+        results = [_station_correlate(task) for task in tqdm(tasks)]
+    else:
+        with mp.Pool(processes=min(cpu_cores,len(tasks))) as pool:
+            results = list(tqdm(pool.imap(_station_correlate,tasks),total=len(tasks)))
+    if cache is not None:
+        for n,info in enumerate(task_info):
+            keys,hit,values = info[5]
+            lags = np.zeros(len(keys),dtype=int)
+            ccs = np.zeros(len(keys))
+            lags[hit] = values[:,0]
+            ccs[hit] = values[:,1]
+            lags[~hit],ccs[~hit] = results[n]
+            cache.put_many([[keys[m],[lags[m],ccs[m]]] for m in np.flatnonzero(~hit)])
+            results[n] = (lags,ccs)
+        print(f">>> {cache.hits} pairs read from the cc cache, {cache.misses} computed")
+
+    # Collect links with cc >= min_cc, ordered by pair, phase and station
+    # order in the stream of the first event
+    pair_idx = []; pha_idx = []; rank_idx = []; link_list = []
+    for (k,sta,pha,sampling_rate,ranks,_),(lags,values) in zip(task_info,results):
+        keep = values >= min_cc
+        for n in np.flatnonzero(keep):
+            link_list.append([sta,lags[n]/sampling_rate,values[n],pha])
+        pair_idx.append(k[keep])
+        pha_idx.append(np.full(np.sum(keep),0 if pha=="P" else 1))
+        rank_idx.append(ranks[keep])
+    event_pair_id = {}
+    event_pair_cc = {}
+    for i,j in zip(ii,jj):
+        pair_id = event_list[i]+event_list[j]
+        event_pair_id[pair_id] = [event_list[i],event_list[j],
+                                  event_id_mapper[event_list[i]],event_id_mapper[event_list[j]]]
+        event_pair_cc[pair_id] = []
+    if len(link_list) == 0:
+        return event_pair_id,event_pair_cc
+    pair_idx = np.concatenate(pair_idx)
+    order = np.lexsort((np.concatenate(rank_idx),np.concatenate(pha_idx),pair_idx))
+    pair_idx = pair_idx[order]
+    starts = np.flatnonzero(np.r_[True,pair_idx[1:]!=pair_idx[:-1]])
+    ends = np.r_[starts[1:],len(pair_idx)]
+    for start,end in zip(starts,ends):
+        if end-start < min_link:
+            continue
+        p = pair_idx[start]
+        pair_id = event_list[ii[p]]+event_list[jj[p]]
+        event_pair_cc[pair_id] = [link_list[n] for n in order[start:end]]
+    return event_pair_id,event_pair_cc
+
+def write_dtcc(event_pair_id,event_pair_cc,f_dtcc='dt.cc'):
+    """
+    Write correlation results into dt.cc, pairs without links are skipped
+    """
+    with open(f_dtcc,'w+') as dt_cc_f:
+        for pair_id in event_pair_id:
+            [_,_,id1,id2] = event_pair_id[pair_id]
+            link_cc = event_pair_cc[pair_id]
+            if len(link_cc)==0:
+                continue
+            dt_cc_f.write("#   %i  %i   0 \n" % (id1,id2))
+            for link in link_cc:
+                dt_cc_f.write("%s %.3f %.3f %s \n" % tuple(link))
+    print("Created dt.cc")
@@ -1,18 +1,290 @@
 #-----------------------------------------------------------------------------
+import warnings
 import numpy as np
-from math import sin,cos,asin,acos,pi,radians
+from math import sin,cos,tan,atan,atan2,sqrt,asin,acos,pi,radians,ceil
 from numba import jit
+from scipy.spatial import cKDTree
+
+WGS84_A = 6378137.0                      # semi-major axis in meters
+WGS84_F = 1/298.257223563                # flattening
+EARTH_R = 6371.0                         # mean radius in km
 
 def spherical_dist(lon_1,lat_1,lon_2,lat_2):
     """
-    Calculate the distance of two postions and return distance in degree
+    Calculate the distance of two postions and return distance in degree.
+    Arrays are accepted and broadcasted, see haversine.
+    """
+    dist = np.degrees(haversine(lat_1,lon_1,lat_2,lon_2,radius=1))
+    if np.ndim(dist) == 0:
+        return float(dist)
+    return dist
+
+def _check_lats(*lats):
+    for lat in lats:
+        if np.any(np.abs(lat)>90):
+            raise Exception("Latitude should be within [-90,90]")
+
+def haversine(lat1,lon1,lat2,lon2,radius=EARTH_R):
+    """
+    Great-circle distance on a sphere by the haversine formula. Arguments
+    follow the order of obspy gps2dist_azimuth and could be arrays of
+    broadcastable shapes, e.g. lat1[:,None] against lat2[None,:] for all
+    pairs.
+
+    Return
+    ----------
+    distance in the unit of radius, km by default
+    """
+    lat1,lon1,lat2,lon2 = [np.radians(np.asarray(v,dtype=float)) for v in (lat1,lon1,lat2,lon2)]
+    a = np.sin((lat2-lat1)/2)**2+np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 2*radius*np.arcsin(np.sqrt(np.clip(a,0,1)))
+
+def sphere_azimuth(lat1,lon1,lat2,lon2):
+    """
+    Azimuth from point 1 to point 2 and the back azimuth on a sphere in
+    degrees within [0,360), arrays are broadcasted as haversine
+    """
+    lat1,lon1,lat2,lon2 = [np.radians(np.asarray(v,dtype=float)) for v in (lat1,lon1,lat2,lon2)]
+    dlon = lon2-lon1
+    az = np.arctan2(np.sin(dlon)*np.cos(lat2),
+                    np.cos(lat1)*np.sin(lat2)-np.sin(lat1)*np.cos(lat2)*np.cos(dlon))
+    baz = np.arctan2(-np.sin(dlon)*np.cos(lat1),
+                     np.cos(lat2)*np.sin(lat1)-np.sin(lat2)*np.cos(lat1)*np.cos(dlon))
+    return np.degrees(az)%360,np.degrees(baz)%360
+
+@jit(nopython=True,cache=True)
+def _vincenty_inverse(lat1s,lon1s,lat2s,lon2s,a,f,dists,azs,bazs):
+    """
+    Vincenty's inverse formula point by point, the same steps as
+    obspy.geodetics.calc_vincenty_inverse. Points failed to converge (nearly
+    antipodal) are marked by dist -1.
+    """
+    b = a*(1-f)
+    for n in range(len(lat1s)):
+        lon1 = lon1s[n]
+        lon2 = lon2s[n]
+        while lon1 > 180:                    # normalize longitude
+            lon1 -= 360
+        while lon1 < -180:
+            lon1 += 360
+        while lon2 > 180:
+            lon2 -= 360
+        while lon2 < -180:
+            lon2 += 360
+        if abs(lat1s[n]-lat2s[n]) <= 1e-9*max(abs(lat1s[n]),abs(lat2s[n])) and \
+           abs(lon1-lon2) <= 1e-9*max(abs(lon1),abs(lon2)):
+            dists[n] = 0.; azs[n] = 0.; bazs[n] = 0.
+            continue
+        lat1 = radians(lat1s[n]); lat2 = radians(lat2s[n])
+        lon1 = radians(lon1); lon2 = radians(lon2)
+        u_1 = atan((1-f)*tan(lat1))
+        u_2 = atan((1-f)*tan(lat2))
+        dlon = lon2-lon1
+        last_dlon = -4000000.0
+        omega = dlon
+        iterlimit = 100
+        failed = False
+        sqr_sin_sigma = 0.; sin_sigma = 0.; cos_sigma = 0.; sigma = 0.
+        sqr_cos_alpha = 0.; cos2sigma_m = 0.
+        while last_dlon < -3000000.0 or dlon != 0 and abs((last_dlon-dlon)/dlon) > 1.0e-9:
+            sqr_sin_sigma = (cos(u_2)*sin(dlon))**2+\
+                            (cos(u_1)*sin(u_2)-sin(u_1)*cos(u_2)*cos(dlon))**2
+            sin_sigma = sqrt(sqr_sin_sigma)
+            cos_sigma = sin(u_1)*sin(u_2)+cos(u_1)*cos(u_2)*cos(dlon)
+            sigma = atan2(sin_sigma,cos_sigma)
+            if sin_sigma == 0:
+                failed = True
+                break
+            sin_alpha = cos(u_1)*cos(u_2)*sin(dlon)/sin_sigma
+            sqr_cos_alpha = 1-sin_alpha*sin_alpha
+            if sqr_cos_alpha == 0:           # equatorial line
+                cos2sigma_m = 0.
+            else:
+                cos2sigma_m = cos_sigma-(2*sin(u_1)*sin(u_2)/sqr_cos_alpha)
+            c = (f/16)*sqr_cos_alpha*(4+f*(4-3*sqr_cos_alpha))
+            last_dlon = dlon
+            dlon = omega+(1-c)*f*sin_alpha*\
+                   (sigma+c*sin_sigma*(cos2sigma_m+c*cos_sigma*(-1+2*cos2sigma_m**2)))
+            iterlimit -= 1
+            if iterlimit < 0:
+                failed = True
+                break
+        if failed:
+            dists[n] = -1.; azs[n] = 0.; bazs[n] = 0.
+            continue
+        u2 = sqr_cos_alpha*(a*a-b*b)/(b*b)
+        _a = 1+(u2/16384)*(4096+u2*(-768+u2*(320-175*u2)))
+        _b = (u2/1024)*(256+u2*(-128+u2*(74-47*u2)))
+        delta_sigma = _b*sin_sigma*(cos2sigma_m+(_b/4)*
+                      (cos_sigma*(-1+2*cos2sigma_m**2)-(_b/6)*
+                       cos2sigma_m*(-3+4*sqr_sin_sigma)*(-3+4*cos2sigma_m**2)))
+        dists[n] = b*_a*(sigma-delta_sigma)
+        alpha12 = atan2(cos(u_2)*sin(dlon),cos(u_1)*sin(u_2)-sin(u_1)*cos(u_2)*cos(dlon))
+        alpha21 = atan2(cos(u_1)*sin(dlon),-sin(u_1)*cos(u_2)+cos(u_1)*sin(u_2)*cos(dlon))
+        if alpha12 < 0.0:
+            alpha12 = alpha12+2.0*pi
+        if alpha12 > 2.0*pi:
+            alpha12 = alpha12-2.0*pi
+        alpha21 = alpha21+pi
+        if alpha21 < 0.0:
+            alpha21 = alpha21+2.0*pi
+        if alpha21 > 2.0*pi:
+            alpha21 = alpha21-2.0*pi
+        azs[n] = alpha12*360/(2.0*pi)
+        bazs[n] = alpha21*360/(2.0*pi)
+
+def vincenty(lat1,lon1,lat2,lon2,a=WGS84_A,f=WGS84_F):
+    """
+    Batch version of obspy.geodetics.gps2dist_azimuth on the ellipsoid by
+    Vincenty's inverse formula. Arrays are broadcasted as haversine, e.g.
+    vincenty(lat,lon,lats,lons) for one point against many.
+
+    Return
+    ----------
+    distance in meters, azimuth and back azimuth in degrees, arrays in the
+    broadcasted shape (floats if all inputs are scalars)
+    """
+    arrays = np.broadcast_arrays(*[np.asarray(v,dtype=float) for v in (lat1,lon1,lat2,lon2)])
+    shape = arrays[0].shape
+    lat1s,lon1s,lat2s,lon2s = [np.ascontiguousarray(v).ravel() for v in arrays]
+    _check_lats(lat1s,lat2s)
+    dists = np.zeros(len(lat1s))
+    azs = np.zeros(len(lat1s))
+    bazs = np.zeros(len(lat1s))
+    _vincenty_inverse(lat1s,lon1s,lat2s,lon2s,a,f,dists,azs,bazs)
+    failed = dists < 0
+    if np.any(failed):                       # as obspy without geographiclib
+        warnings.warn("Catching unstable calculation on antipodes, "
+                      "distance set 20004314.5 m")
+        dists[failed] = 20004314.5
+    if len(shape) == 0:
+        return float(dists[0]),float(azs[0]),float(bazs[0])
+    return dists.reshape(shape),azs.reshape(shape),bazs.reshape(shape)
+
+def dist_azimuth(lat1,lon1,lat2,lon2,method="vincenty"):
     """
-    lon_1 = radians(lon_1)
-    lat_1 = radians(lat_1)
-    lon_2 = radians(lon_2)
-    lat_2 = radians(lat_2)
-    a=acos(sin(lat_1)*sin(lat_2)+cos(lat_1)*cos(lat_2)*cos(lon_2-lon_1))
-    return a*180/pi
+    Distance in meters, azimuth and back azimuth of arrays of point pairs.
+
+    Parameters
+    -----------
+    lat1,lon1,lat2,lon2: arrays in broadcastable shapes
+                 method: "vincenty" on the WGS84 ellipsoid as obspy
+                         gps2dist_azimuth, or "haversine" on a sphere of
+                         radius EARTH_R, faster but with error up to 0.5%
+    """
+    if method == "vincenty":
+        return vincenty(lat1,lon1,lat2,lon2)
+    elif method == "haversine":
+        _check_lats(lat1,lat2)
+        az,baz = sphere_azimuth(lat1,lon1,lat2,lon2)
+        return haversine(lat1,lon1,lat2,lon2)*1000,az,baz
+    else:
+        raise Exception(f"Unrecognized method {method}, should be 'vincenty' or 'haversine'")
+
+def lonlat2xy(lons,lats,lon0=None,lat0=None):
+    """
+    Convert longitude and latitude arrays into local Cartesian coordinates in
+    km about (lon0,lat0). The default origin is the mean location.
+    """
+    lons = np.asarray(lons,dtype=float)
+    lats = np.asarray(lats,dtype=float)
+    if lon0 == None:
+        lon0 = np.mean(lons)
+    if lat0 == None:
+        lat0 = np.mean(lats)
+    xs = (lons-lon0)*111.19*cos(radians(lat0))
+    ys = (lats-lat0)*111.19
+    return xs,ys
+
+def lonlat2ecef(lons,lats,deps=None,a=WGS84_A/1000,f=WGS84_F):
+    """
+    Earth-centered Earth-fixed coordinates in km on the WGS84 ellipsoid,
+    deps is depth in km below the ellipsoid (0 if not provided)
+    """
+    lons = np.radians(np.asarray(lons,dtype=float))
+    lats = np.radians(np.asarray(lats,dtype=float))
+    hs = 0 if deps is None else -np.asarray(deps,dtype=float)
+    e2 = f*(2-f)
+    n = a/np.sqrt(1-e2*np.sin(lats)**2)     # prime vertical radius
+    xs = (n+hs)*np.cos(lats)*np.cos(lons)
+    ys = (n+hs)*np.cos(lats)*np.sin(lons)
+    zs = (n*(1-e2)+hs)*np.sin(lats)
+    return xs,ys,zs
+
+def neighbour_pairs(lons,lats,radius_km,deps=None,coords="ecef",return_dist=False,chunk=50000):
+    """
+    Find all pairs of points separated less than radius_km with a KD-tree.
+
+    Parameters
+    -----------
+      lons,lats: point locations
+      radius_km: search radius
+           deps: depth in km, None for points on the surface
+         coords: "ecef" uses the straight-line distance in Earth-centered
+                 coordinates, which is never longer than the geodesic, so
+                 no pair within radius_km on the surface is missed. "local"
+                 uses the Cartesian coordinates of lonlat2xy (and depth),
+                 fast but distorted away from the mean latitude.
+    return_dist: also return the distance of each pair in km
+          chunk: points queried together when there are more points,
+                 bounds the temporary memory for catalogs of 10^6 points
+
+    Return
+    ----------
+    index arrays i,j (int32) with i<j, sorted by i then j, and the distance
+    array (float32) if return_dist is True
+    """
+    if coords == "ecef":
+        pts = np.column_stack(lonlat2ecef(lons,lats,deps))
+    elif coords == "local":
+        xs,ys = lonlat2xy(lons,lats)
+        zs = np.zeros(len(xs)) if deps is None else np.asarray(deps,dtype=float)
+        pts = np.column_stack((xs,ys,zs))
+    else:
+        raise Exception(f"Unrecognized coords {coords}, should be 'ecef' or 'local'")
+    qty = len(pts)
+    itype = np.int32 if qty < 2**31 else np.int64
+    if qty == 0:
+        ii = np.zeros(0,dtype=itype)
+        if return_dist:
+            return ii,ii.copy(),np.zeros(0,dtype=np.float32)
+        return ii,ii.copy()
+    tree = cKDTree(pts)
+    iis = []; jjs = []
+    for c0 in range(0,qty,chunk):
+        if qty <= chunk:                         # all pairs at once
+            pairs = tree.query_pairs(radius_km,output_type="ndarray")
+            ii = np.minimum(pairs[:,0],pairs[:,1]).astype(np.int64)
+            jj = np.maximum(pairs[:,0],pairs[:,1]).astype(np.int64)
+        else:                                    # pairs of chunk points with all points
+            sub = cKDTree(pts[c0:c0+chunk])
+            rec = sub.sparse_distance_matrix(tree,radius_km,output_type="ndarray")
+            ii = rec["i"].astype(np.int64)+c0
+            jj = rec["j"].astype(np.int64)
+            k = jj > ii
+            ii = ii[k]; jj = jj[k]
+        keys = ii*qty+jj                         # sort by i then j
+        keys.sort()
+        iis.append((keys//qty).astype(itype))
+        jjs.append((keys%qty).astype(itype))
+    ii = np.concatenate(iis)
+    jj = np.concatenate(jjs)
+    if return_dist:
+        dists = np.zeros(len(ii),dtype=np.float32)
+        for c0 in range(0,len(ii),1000000):
+            diff = pts[ii[c0:c0+1000000]]-pts[jj[c0:c0+1000000]]
+            dists[c0:c0+1000000] = np.sqrt(np.sum(diff*diff,axis=1))
+        return ii,jj,dists
+    return ii,jj
+
+def neighbour_lists(lons,lats,radius_km,deps=None,coords="ecef"):
+    """
+    For each point, list the index of later points (larger index) separated
+    less than radius_km. Return a list of int arrays.
+    """
+    ii,jj = neighbour_pairs(lons,lats,radius_km,deps=deps,coords=coords)
+    splits = np.searchsorted(ii,np.arange(1,len(lons)))
+    return np.split(jj,splits)
 
 @jit(nopython=True)
 def in_rectangle(locs,alon,alat,blon,blat,width):
@@ -44,6 +316,136 @@ def in_rectangle(locs,alon,alat,blon,blat,width):
             results[i,1]=proj_length
     return results
 
+class SpatialIndex():
+    def __init__(self,lons,lats,deps,lon0=None,lat0=None):
+        """
+        KD-tree index of points in local Cartesian km (lonlat2xy about
+        lon0,lat0, default the mean location) with depth in km. Horizontal
+        queries use a tree of x,y and check depth afterwards, a tree of
+        x,y,depth is built on the first 3-D radius query. Candidates from
+        the trees are checked with the exact condition of each query, the
+        return is a sorted index array of the points.
+
+        >>> sindex = SpatialIndex(locs[:,0],locs[:,1],locs[:,2])
+        >>> idxs = sindex.radius(104.5,29.5,2)            # within 2 km
+        >>> idxs,dists = sindex.rectangle(104,29,105,30,0.05)
+        """
+        self.lons = np.asarray(lons,dtype=float)
+        self.lats = np.asarray(lats,dtype=float)
+        self.deps = np.asarray(deps,dtype=float)
+        if lon0 == None:
+            lon0 = np.mean(self.lons) if len(self.lons) > 0 else 0
+        if lat0 == None:
+            lat0 = np.mean(self.lats) if len(self.lats) > 0 else 0
+        self.lon0 = lon0
+        self.lat0 = lat0
+        xs,ys = lonlat2xy(self.lons,self.lats,lon0,lat0)
+        self.xys = np.column_stack((xs,ys))
+        self.tree = cKDTree(self.xys) if len(self.lons) > 0 else None
+        self._tree3d = None
+
+    def _xy(self,lons,lats):
+        return lonlat2xy(np.atleast_1d(lons),np.atleast_1d(lats),self.lon0,self.lat0)
+
+    def _query(self,xs,ys,r,p=2):
+        """
+        Union of the points within r of the centers (xs,ys)
+        """
+        if self.tree == None or len(xs) == 0:
+            return np.zeros(0,dtype=np.int64)
+        lists = self.tree.query_ball_point(np.column_stack((xs,ys)),r,p=p,return_sorted=False)
+        idxs = np.concatenate([np.array(l,dtype=np.int64) for l in lists])
+        return np.unique(idxs)
+
+    def _depth_mask(self,idxs,depmin,depmax):
+        mask = np.ones(len(idxs),dtype=bool)
+        if depmin != None:
+            mask &= self.deps[idxs]>=depmin
+        if depmax != None:
+            mask &= self.deps[idxs]<=depmax
+        return mask
+
+    def box(self,lonmin,lonmax,latmin,latmax,depmin=None,depmax=None):
+        """
+        Points inside the lon-lat boundary and the depth range, bounds
+        included, None for no depth bound
+        """
+        (x1,x2),(y1,y2) = self._xy([lonmin,lonmax],[latmin,latmax])
+        if x1 > x2 or y1 > y2:
+            return np.zeros(0,dtype=np.int64)
+        # squares with the short side of the box along the long side, at
+        # most 1000 squares for thin boxes
+        half = max(min(x2-x1,y2-y1),max(x2-x1,y2-y1)/1000)/2+1e-6
+        if x2-x1 >= y2-y1:
+            xs = np.arange(x1+half,x2+half,2*half)
+            ys = np.full(len(xs),(y1+y2)/2)
+        else:
+            ys = np.arange(y1+half,y2+half,2*half)
+            xs = np.full(len(ys),(x1+x2)/2)
+        idxs = self._query(xs,ys,half,p=np.inf)
+        k = (self.lons[idxs]>=lonmin)&(self.lons[idxs]<=lonmax)&\
+            (self.lats[idxs]>=latmin)&(self.lats[idxs]<=latmax)&\
+            self._depth_mask(idxs,depmin,depmax)
+        return idxs[k]
+
+    def radius(self,lon,lat,radius_km,dep=None):
+        """
+        Points within radius_km of (lon,lat) in local Cartesian km. If dep
+        is provided, the distance is 3-D to the point at depth dep,
+        otherwise the horizontal distance at all depths.
+        """
+        if self.tree == None:
+            return np.zeros(0,dtype=np.int64)
+        xs,ys = self._xy(lon,lat)
+        if dep == None:
+            idxs = self.tree.query_ball_point([xs[0],ys[0]],radius_km)
+        else:
+            if self._tree3d == None:
+                self._tree3d = cKDTree(np.column_stack((self.xys,self.deps)))
+            idxs = self._tree3d.query_ball_point([xs[0],ys[0],dep],radius_km)
+        return np.sort(np.array(idxs,dtype=np.int64))
+
+    def polygon(self,lonlats,depmin=None,depmax=None):
+        """
+        Points inside the polygon of [[lon,lat],...] vertices and the depth
+        range
+        """
+        from matplotlib.path import Path
+        lonlats = np.asarray(lonlats,dtype=float)
+        idxs = self.box(np.min(lonlats[:,0]),np.max(lonlats[:,0]),
+                        np.min(lonlats[:,1]),np.max(lonlats[:,1]),depmin,depmax)
+        if len(idxs) == 0:
+            return idxs
+        inside = Path(lonlats).contains_points(np.column_stack((self.lons[idxs],self.lats[idxs])))
+        return idxs[inside]
+
+    def rectangle(self,alon,alat,blon,blat,width):
+        """
+        Points inside the rotated rectangle of in_rectangle: along the line
+        from a to b and within width (degree) of it. Return idxs and the
+        distances (km) of the points along the line from a.
+        """
+        # The line is cut into m pieces no longer than 2*width (one piece
+        # for zero width), a point of the rectangle is within
+        # sqrt(width**2+(piece/2)**2) degree of the center of its piece,
+        # which is no more than 111.19 km per degree in lonlat2xy.
+        norm = ((blon-alon)**2+(blat-alat)**2)**0.5
+        if width > 0:
+            m = max(1,int(ceil(norm/(2*width))))
+        else:                                    # points on the line only
+            m = 1
+        ts = (np.arange(m)+0.5)/m
+        r_deg = sqrt(width**2+(norm/(2*m))**2)
+        xs,ys = self._xy(alon+ts*(blon-alon),alat+ts*(blat-alat))
+        idxs = self._query(xs,ys,r_deg*111.19+1e-6)
+        locs = np.column_stack((self.lons[idxs],self.lats[idxs]))
+        results = in_rectangle(locs,alon,alat,blon,blat,width)
+        k = results[:,0]==1
+        return idxs[k],results[k,1]
+
+    def __len__(self):
+        return len(self.lons)
+
 def in_ellipse(xy_list,width,height,angle=0,xy=[0,0]):
     """
     Find data points inside an ellipse and return index list
@@ -0,0 +1,248 @@
+#-----------------------------------------------------------------------------
+#   Matched-filter detection of continuous data with event templates.
+#   The day trace is transformed once and reused by all templates, the
+#   correlation is computed by overlap-save in the frequency domain as
+#   seisloc.scc.sliding_dot does.
+#-----------------------------------------------------------------------------
+import numpy as np
+import obspy
+from obspy import UTCDateTime
+from scipy import fft as sfft
+from tqdm import tqdm
+from seisloc.scc import _next_pow2
+
+def day_spectrum(day_data,mm,nfft=None):
+    """
+    Overlap-save spectrum of a long trace for templates of length mm, to be
+    reused by template_cc for any number of templates.
+
+    Parameters
+    -----------
+    day_data: 1-D continuous data
+          mm: template length in samples
+        nfft: FFT block length, default next_pow2(8*mm) and at least 4096
+
+    Return
+    ----------
+    dict with keys "spec" (complex64, (nblk,nfft/2+1)), "norm" (float32,
+    sqrt of sliding window energy, (nlag,)), "nfft", "step", "nlag", "mm"
+    """
+    day_data = np.asarray(day_data,dtype=float)
+    npts = len(day_data)
+    if npts < mm:
+        raise Exception(f"Trace length {npts} shorter than template length {mm}")
+    nlag = npts-mm+1
+    if nfft == None:
+        nfft = min(_next_pow2(npts),max(_next_pow2(8*mm),4096))
+    if nfft < mm:
+        raise Exception(f"nfft {nfft} should not be shorter than template length {mm}")
+    step = nfft-mm+1
+    nblk = int(np.ceil(nlag/step))
+    pad = (nblk-1)*step+nfft-npts
+    data = np.pad(day_data,(0,max(pad,0))).astype(np.float32)
+    blocks = np.lib.stride_tricks.sliding_window_view(data,nfft)[::step]
+    spec = sfft.rfft(blocks,axis=-1,workers=-1)
+    cs = np.zeros(npts+1)
+    cs[1:] = np.cumsum(day_data*day_data)
+    energy = cs[mm:]-cs[:-mm]
+    energy[energy<0] = 0                     # round-off of the running sum
+    return {"spec":spec,"norm":np.sqrt(energy).astype(np.float32),
+            "nfft":nfft,"step":step,"nlag":nlag,"mm":mm}
+
+def template_cc(spectrum,tmplt_datas,blk_chunk=64):
+    """
+    Normalized cross-correlation of templates against the trace of
+    spectrum (see day_spectrum). Blocks are processed blk_chunk at a time to
+    bound the memory.
+
+    Parameters
+    -----------
+       spectrum: output of day_spectrum
+    tmplt_datas: templates in shape (ntmp,mm)
+
+    Return
+    ----------
+    cc in shape (ntmp,nlag), float32. Windows without energy are set 0.
+    """
+    tmplt_datas = np.atleast_2d(np.asarray(tmplt_datas,dtype=float))
+    mm = spectrum["mm"]
+    nfft = spectrum["nfft"]
+    step = spectrum["step"]
+    nlag = spectrum["nlag"]
+    if tmplt_datas.shape[1] != mm:
+        raise Exception(f"Template length {tmplt_datas.shape[1]} differs from spectrum {mm}")
+    norm_tmplt = np.sqrt(np.sum(tmplt_datas*tmplt_datas,axis=1)).astype(np.float32)
+    spec_t = np.conj(sfft.rfft(tmplt_datas.astype(np.float32),nfft,axis=-1,workers=-1))
+    spec = spectrum["spec"]
+    norm = spectrum["norm"]
+    cc = np.zeros((len(tmplt_datas),nlag),dtype=np.float32)
+    for b0 in range(0,len(spec),blk_chunk):
+        b1 = min(b0+blk_chunk,len(spec))
+        prod = spec[None,b0:b1,:]*spec_t[:,None,:]
+        seg = sfft.irfft(prod,nfft,axis=-1,workers=-1)[...,:step]
+        i1 = b0*step
+        i2 = min(b1*step,nlag)
+        seg = seg.reshape(len(tmplt_datas),-1)[:,:i2-i1]
+        denom = norm[None,i1:i2]*norm_tmplt[:,None]
+        np.divide(seg,denom,out=cc[:,i1:i2],where=denom>0)
+    return cc
+
+def stack_cc(stack,count,cc,offset,has=None,live=None,rows=None):
+    """
+    Shift the correlation functions of one channel by moveout and add them
+    into the stack in place. The mean is stack/count.
+
+    Parameters
+    -----------
+    stack,count: sum of cc and the number of channels added, (ntmp,nlag),
+                 the k-th value is for template origin at sample k
+             cc: cc of this channel in shape (ntmp,nlag_c)
+         offset: template window start relative to the template origin in
+                 samples (ntmp,), negative offset is allowed
+            has: bool array (ntmp,), False if the template has no such channel
+           live: bool array (nlag_c,), False for windows of the channel
+                 without data (e.g. zero-filled gaps), these are not counted
+           rows: stack row of each cc row when cc is computed for part of
+                 the templates, default cc row t for stack row t
+    """
+    nlag = stack.shape[1]
+    if rows is None:
+        rows = range(len(stack))
+    for k,t in enumerate(rows):
+        if has is not None and not has[t]:
+            continue
+        off = int(offset[t])
+        k1 = max(0,-off)                         # stack[k] += cc[k+off]
+        k2 = min(nlag,cc.shape[1]-off)
+        if k2 <= k1:
+            continue
+        stack[t,k1:k2] += cc[k,k1+off:k2+off]
+        if live is None:
+            count[t,k1:k2] += 1
+        else:
+            count[t,k1:k2] += live[k1+off:k2+off]
+
+def mad_detect(stack,mad_mult=9,min_sep=100,valid=None):
+    """
+    Pick peaks of a stacked cc function above median+mad_mult*MAD, peaks
+    closer than min_sep samples to a larger one are discarded. If the bool
+    array valid is provided, the median and MAD are taken over the valid
+    samples only and peaks are only picked inside them.
+
+    Return
+    ----------
+    index list, value list and the threshold
+    """
+    stack = np.asarray(stack)
+    if valid is None:
+        valid = np.ones(len(stack),dtype=bool)
+    if not np.any(valid):
+        return [],[],np.nan
+    med = np.median(stack[valid])
+    mad = np.median(np.abs(stack[valid]-med))
+    thr = med+mad_mult*mad
+    above = (stack > thr)&valid
+    if not np.any(above):
+        return [],[],thr
+    edges = np.diff(np.r_[0,above.astype(np.int8),0])
+    starts = np.flatnonzero(edges==1)
+    ends = np.flatnonzero(edges==-1)
+    peaks = np.array([s+np.argmax(stack[s:e]) for s,e in zip(starts,ends)])
+    order = np.argsort(stack[peaks])[::-1]
+    kept = []
+    for p in peaks[order]:
+        if all([abs(p-q)>=min_sep for q in kept]):
+            kept.append(p)
+    kept.sort()
+    return kept,[float(stack[p]) for p in kept],thr
+
+def template_from_sacs(sac_paths,tb,te,marker="a"):
+    """
+    Build a template from the sac files of one event, e.g. eve_wf_bp/<day>/<event>/*.
+    The sac reference time should be the event origin time as cut_eve_wf
+    writes, the window is [marker+tb,marker+te].
+
+    Return
+    ----------
+    dict {"data":{channel id:array},"offset":{channel id:seconds},
+          "origin":UTCDateTime,"delta":delta}, channel id is "net.sta..chn"
+    """
+    template = {"data":{},"offset":{},"origin":None,"delta":None}
+    for sac_path in sac_paths:
+        tr = obspy.read(sac_path)[0]
+        if not hasattr(tr.stats.sac,marker):
+            continue
+        arr = tr.stats.sac[marker]
+        delta = tr.stats.delta
+        b = tr.stats.sac.b
+        mm = int(round((te-tb)/delta))
+        i1 = int(round((arr+tb-b)/delta))
+        if i1 < 0 or i1+mm > tr.stats.npts:
+            continue
+        chn_id = f"{tr.stats.network}.{tr.stats.station}..{tr.stats.channel}"
+        template["data"][chn_id] = np.asarray(tr.data[i1:i1+mm],dtype=float)
+        template["offset"][chn_id] = arr+tb
+        template["origin"] = tr.stats.starttime-b
+        template["delta"] = delta
+    return template
+
+def match_filter(templates,st,mad_mult=9,trig_int=2,min_chn=3,tmplt_chunk=8,nfft=None):
+    """
+    Network matched-filter detection of templates in continuous data.
+
+    Parameters
+    -----------
+      templates: dict {name:template}, template in the format of
+                 template_from_sacs, all with the same window length and delta
+             st: obspy Stream of continuous data of the same sampling rate,
+                 filtered in the same band as templates, one trace per channel
+       mad_mult: detection threshold in MAD of the stacked cc
+       trig_int: minimum interval between detections of one template, seconds
+        min_chn: minimum channels of a template in the data to run
+    tmplt_chunk: number of templates correlated together, memory used is
+                 about 10 bytes*tmplt_chunk*data samples
+
+    Return
+    ----------
+    list of [name,detect origin time,mean cc,channel qty,threshold]
+    """
+    st = st.copy().merge(fill_value=0)
+    names = list(templates.keys())
+    delta = templates[names[0]]["delta"]
+    mm = len(next(iter(templates[names[0]]["data"].values())))
+    starttime = min([tr.stats.starttime for tr in st])
+    endtime = max([tr.stats.endtime for tr in st])
+    nlag = int(round((endtime-starttime)/delta))+1
+    spectra = {}
+    for tr in st:
+        if abs(tr.stats.delta-delta)>1e-6*delta:
+            raise Exception(f"Sampling interval of {tr.id} differs from templates")
+        i0 = int(round((tr.stats.starttime-starttime)/delta))
+        spectra[tr.id] = [i0,day_spectrum(tr.data,mm,nfft)]
+    detections = []
+    for c0 in tqdm(range(0,len(names),tmplt_chunk)):
+        chunk = names[c0:c0+tmplt_chunk]
+        stack = np.zeros((len(chunk),nlag),dtype=np.float32)
+        count = np.zeros((len(chunk),nlag),dtype=np.int16)
+        for chn_id,(i0,spectrum) in spectra.items():
+            has = np.array([chn_id in templates[name]["data"] for name in chunk])
+            if not np.any(has):
+                continue
+            rows = np.flatnonzero(has)           # Only templates with this channel
+            tmplt_datas = np.zeros((len(rows),mm))
+            offset = np.zeros(len(chunk),dtype=int)
+            for k,t in enumerate(rows):
+                tmplt_datas[k] = templates[chunk[t]]["data"][chn_id]
+                offset[t] = int(round(templates[chunk[t]]["offset"][chn_id]/delta))-i0
+            cc = template_cc(spectrum,tmplt_datas)
+            stack_cc(stack,count,cc,offset,live=spectrum["norm"]>0,rows=rows)
+        for t,name in enumerate(chunk):
+            valid = count[t] >= min_chn
+            if not np.any(valid):
+                continue
+            mean_cc = np.zeros(nlag,dtype=np.float32)
+            mean_cc[valid] = stack[t,valid]/count[t,valid]
+            idxs,values,thr = mad_detect(mean_cc,mad_mult,int(round(trig_int/delta)),valid)
+            for idx,value in zip(idxs,values):
+                detections.append([name,starttime+idx*delta,value,int(count[t,idx]),float(thr)])
+    return detections
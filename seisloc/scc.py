@@ -8,6 +8,8 @@
 #            doi:10.1785/0120090038
 #   History: 
 #       2021-01-25 Initial coding
+#       2026-10-18 Add FFT (overlap-save) engine for data_scc
+#       2026-10-18 Add parallel multi-target kernel data_scc_batch
 #
 #     Usage: python scc.py [-Ccc] [-E] [-Mn] [-O] [-Tlength] [-Wt1/t2[/maxShift]]
 #            -C: cross-correlation threshold (default = 0.7)
@@ -15,7 +17,6 @@
 
 import obspy
 from obspy import Stream,UTCDateTime
-from obspy.geodetics import gps2dist_azimuth
 from math import sqrt
 import numpy as np
 import sys
@@ -23,11 +24,21 @@ import os
 import re
 import glob
 import shutil
-from numba import jit
+import copy
+import pickle
+import io
+import gzip
+from functools import lru_cache
+import multiprocessing as mp
+from scipy.signal import iirfilter,zpk2sos,sosfilt,detrend
+from scipy.signal.windows import hann
+from numba import jit,prange
 from tqdm import tqdm
 from seisloc.hypoinv import load_sum_evid,load_sum_evstr
+from seisloc.geometry import vincenty
+from seisloc.cccache import wf_hash,cc_key
 
-def wf_scc(tmplt_st,sta_st,ncom):
+def wf_scc(tmplt_st,sta_st,ncom,method="fft"):
     """
     Sliding-window cross-correlation between template and target waveform
     reference: Yang et al.,2009, BSSA.
@@ -37,6 +48,8 @@ def wf_scc(tmplt_st,sta_st,ncom):
     tmplt_st: template waveform of one station
        sta_st: target waveform of the same station
          ncom: number of component, n = 3 means 3 components cross-correlation
+       method: "fft" for the FFT engine, "loop" for the direct jit kernel or
+               "numba" for the parallel jit kernel
 
     Return
     -----------
@@ -48,16 +61,254 @@ def wf_scc(tmplt_st,sta_st,ncom):
     tmplt_data = []
     sta_data = []
     if ncom == 3:
-        tmplt_data.append([tmplt_st.select(component="*N")[0].data])
-        tmplt_data.append([tmplt_st.select(component="*E")[0].data])
-        tmplt_data.append([tmplt_st.select(component="*Z")[0].data])
-        sta_data.append([sta_st.select(component="*N")[0].data])
-        sta_data.append([sta_st.select(component="*E")[0].data])
-        sta_data.append([sta_st.select(component="*Z")[0].data])
+        for comp in ["*N","*E","*Z"]:
+            tmplt_data.append(tmplt_st.select(component=comp)[0].data)
+            sta_data.append(sta_st.select(component=comp)[0].data)
     elif ncom == 1:
-        tmplt_data.append([tmplt_sta[0].data])
-    dt = temp[0].stats.delta
-    ccmax,aamax,i0,cc_list = data_scc(tmplt_data,st_data,ncom)
+        tmplt_data.append(tmplt_st[0].data)
+        sta_data.append(sta_st[0].data)
+    tmplt_data = np.array(tmplt_data,dtype=float)
+    sta_data = np.array(sta_data,dtype=float)
+    ccmax,aamax,i0 = xcorr_scc(tmplt_data,sta_data,ncom,method=method)[:3]
+    return ccmax,aamax,i0
+
+def xcorr_scc(tmplt_data,st_data,ncom,method="fft",return_cc=False):
+    """
+    Switch between the sliding-window cross-correlation implementations.
+
+    Parameters
+    -----------
+    tmplt_data: template waveform in shape (ncom,mm)
+       st_data: target waveform in shape (ncom,npts), npts >= mm
+          ncom: number of component
+        method: "fft" uses data_scc_fft, "loop" uses the jit kernel data_scc,
+                "numba" uses the parallel kernel data_scc_batch
+     return_cc: if True, also return the cross-correlation trace
+
+    Return
+    ----------
+    ccmax,aamax,i0 and the cc array if return_cc is True
+    """
+    if method == "fft":
+        return data_scc_fft(tmplt_data,st_data,ncom,return_cc=return_cc)
+    elif method == "loop":
+        ccmax,aamax,i0,cc_list = data_scc(tmplt_data,st_data,ncom)
+        if return_cc:
+            return ccmax,aamax,i0,np.array(cc_list)
+        return ccmax,aamax,i0
+    elif method == "numba":
+        tmplt_data = np.ascontiguousarray(np.asarray(tmplt_data,dtype=float)[:ncom])
+        st_data = np.ascontiguousarray(np.asarray(st_data,dtype=float)[None,:ncom])
+        ccmaxs = np.zeros(1); aamaxs = np.zeros(1); i0s = np.zeros(1,dtype=np.int64)
+        if return_cc:
+            ccs = np.zeros((1,st_data.shape[2]-tmplt_data.shape[1]+1))
+        else:
+            ccs = np.zeros((0,0))
+        data_scc_batch(tmplt_data,st_data,template_norm(tmplt_data),ccmaxs,aamaxs,i0s,ccs)
+        if return_cc:
+            return ccmaxs[0],aamaxs[0],int(i0s[0]),ccs[0]
+        return ccmaxs[0],aamaxs[0],int(i0s[0])
+    else:
+        raise Exception(f"Unrecognized method {method}, should be 'fft', 'loop' or 'numba'")
+
+def _next_pow2(n):
+    return 1<<int(np.ceil(np.log2(max(n,1))))
+
+def sliding_dot(tmplt_data,st_data,nfft=None):
+    """
+    Sliding dot product between template and target summed over components,
+    computed in the frequency domain by overlap-save.
+
+    Parameters
+    -----------
+    tmplt_data: template in shape (ncom,mm)
+       st_data: target in shape (...,ncom,npts), leading axes are batched
+          nfft: FFT block length. Default one block for short targets, blocks
+                of next_pow2(8*mm) (at least 4096) for long targets
+
+    Return
+    ----------
+    array in shape (...,npts-mm+1), the i-th value is sum(tmplt*st[i:i+mm])
+    """
+    tmplt_data = np.asarray(tmplt_data,dtype=float)
+    st_data = np.asarray(st_data,dtype=float)
+    mm = tmplt_data.shape[-1]
+    npts = st_data.shape[-1]
+    if npts < mm:
+        raise Exception(f"Target length {npts} shorter than template length {mm}")
+    nlag = npts-mm+1
+    if nfft == None:
+        nfft = min(_next_pow2(npts),max(_next_pow2(8*mm),4096))
+    if nfft < mm:
+        raise Exception(f"nfft {nfft} should not be shorter than template length {mm}")
+    step = nfft-mm+1                          # valid lags per block
+    nblk = int(np.ceil(nlag/step))
+    pad = (nblk-1)*step+nfft-npts
+    if pad > 0:
+        padding = [(0,0)]*(st_data.ndim-1)+[(0,pad)]
+        st_data = np.pad(st_data,padding)
+    blocks = np.lib.stride_tricks.sliding_window_view(st_data,nfft,axis=-1)[...,::step,:]
+    spec_t = np.conj(np.fft.rfft(tmplt_data,nfft,axis=-1))      # (ncom,nf)
+    spec_s = np.fft.rfft(blocks,axis=-1)                          # (...,ncom,nblk,nf)
+    spec = np.sum(spec_s*spec_t[:,None,:],axis=-3)                # (...,nblk,nf)
+    out = np.fft.irfft(spec,nfft,axis=-1)[...,:step]
+    out = out.reshape(out.shape[:-2]+(nblk*step,))
+    return out[...,:nlag]
+
+def sliding_norm(st_data,mm):
+    """
+    Energy of the target in every sliding window of length mm, summed over
+    components. Return shape (...,npts-mm+1).
+    """
+    st_data = np.asarray(st_data,dtype=float)
+    energy = np.sum(st_data*st_data,axis=-2)
+    cs = np.zeros(energy.shape[:-1]+(energy.shape[-1]+1,))
+    cs[...,1:] = np.cumsum(energy,axis=-1)
+    norm = cs[...,mm:]-cs[...,:-mm]
+    norm[norm<0] = 0                          # round-off of the running sum
+    return norm
+
+def _fft_cc(tmplt_data,st_data):
+    """
+    Normalized cross-correlation of a template against one or a stack of
+    targets. Return cc and the target window norm, both (...,npts-mm+1), and
+    the template norm.
+    """
+    mm = tmplt_data.shape[-1]
+    normMaster = sqrt(np.sum(tmplt_data*tmplt_data))
+    dots = sliding_dot(tmplt_data,st_data)
+    norm = np.sqrt(sliding_norm(st_data,mm))
+    cc = np.zeros(dots.shape)
+    kk = norm>0
+    cc[kk] = dots[kk]/(norm[kk]*normMaster)
+    return cc,norm,normMaster
+
+def data_scc_fft(tmplt_data,st_data,ncom,return_cc=False):
+    """
+    FFT version of data_scc. Same definitions of ccmax, aamax and i0, computed
+    in O(npts*log(npts)) rather than O(npts*mm).
+
+    Parameters
+    -----------
+    tmplt_data: template waveform in shape (ncom,mm)
+       st_data: target waveform in shape (ncom,npts)
+          ncom: number of component, n = 3 means 3 components cross-correlation
+     return_cc: if True, also return the cross-correlation trace
+
+    return
+    ----------
+         ccmax: maximum cross-correlation coefficient
+         aamax: amplitude ratio at ccmax
+            i0: the shifting index at ccmax
+            cc: cross-correlation coefficient of each step (return_cc=True)
+    """
+    tmplt_data = np.asarray(tmplt_data,dtype=float)[:ncom]
+    st_data = np.asarray(st_data,dtype=float)[:ncom]
+    cc,norm,normMaster = _fft_cc(tmplt_data,st_data)
+    i0 = len(cc)-1-int(np.argmax(cc[::-1]))   # the last maximum, same as data_scc
+    ccmax = cc[i0]
+    aamax = norm[i0]/normMaster
+    if return_cc:
+        return ccmax,aamax,i0,cc
+    return ccmax,aamax,i0
+
+def batch_scc(tmplt_data,tar_datas,ncom=None,method="fft"):
+    """
+    Sliding-window cross-correlation of one template against a stack of
+    target windows in one call.
+
+    Parameters
+    -----------
+    tmplt_data: template waveform in shape (ncom,mm)
+     tar_datas: target windows in shape (ntar,ncom,npts), npts >= mm
+          ncom: number of component, default all rows of tmplt_data
+        method: "fft" correlates all targets in one vectorized FFT call,
+                "loop" runs the jit kernel data_scc target by target,
+                "numba" runs the parallel kernel data_scc_batch
+
+    float32 inputs, e.g. slices of seisloc.wf.wfbank.WfBank, are taken as
+    they are, the samples are converted to float64 inside the kernels
+    ("numba") or once as the input of the FFT ("fft").
+
+    Return
+    ----------
+        ccmaxs: maximum cross-correlation coefficient of each target
+        aamaxs: amplitude ratio at ccmax of each target
+           i0s: the shifting index at ccmax of each target
+    """
+    tmplt_data = np.asarray(tmplt_data)
+    tar_datas = np.asarray(tar_datas)
+    if tmplt_data.dtype not in (np.float32,np.float64):
+        tmplt_data = tmplt_data.astype(float)
+    if tar_datas.dtype not in (np.float32,np.float64):
+        tar_datas = tar_datas.astype(float)
+    if ncom == None:
+        ncom = tmplt_data.shape[0]
+    tmplt_data = tmplt_data[:ncom]
+    tar_datas = tar_datas[:,:ncom]
+    ntar = tar_datas.shape[0]
+    if method == "loop":
+        tmplt_data = np.asarray(tmplt_data,dtype=float)
+        tar_datas = np.asarray(tar_datas,dtype=float)
+        ccmaxs = np.zeros(ntar)
+        aamaxs = np.zeros(ntar)
+        i0s = np.zeros(ntar,dtype=int)
+        for k in range(ntar):
+            ccmaxs[k],aamaxs[k],i0s[k],_ = data_scc(tmplt_data,tar_datas[k],ncom)
+        return ccmaxs,aamaxs,i0s
+    elif method == "numba":
+        ccmaxs = np.zeros(ntar)
+        aamaxs = np.zeros(ntar)
+        i0s = np.zeros(ntar,dtype=np.int64)
+        data_scc_batch(np.ascontiguousarray(tmplt_data),np.ascontiguousarray(tar_datas),
+                       template_norm(tmplt_data),ccmaxs,aamaxs,i0s,np.zeros((0,0)))
+        return ccmaxs,aamaxs,i0s
+    elif method != "fft":
+        raise Exception(f"Unrecognized method {method}, should be 'fft', 'loop' or 'numba'")
+    if ntar == 0:
+        return np.zeros(0),np.zeros(0),np.zeros(0,dtype=int)
+    cc,norm,normMaster = _fft_cc(np.asarray(tmplt_data,dtype=float),
+                                 np.asarray(tar_datas,dtype=float))
+    i0s = cc.shape[1]-1-np.argmax(cc[:,::-1],axis=1)
+    rows = np.arange(ntar)
+    ccmaxs = cc[rows,i0s]
+    aamaxs = norm[rows,i0s]/normMaster
+    return ccmaxs,aamaxs,i0s
+
+def cached_batch_scc(tmplt_data,tar_datas,ncom=None,method="fft",cache=None,**params):
+    """
+    batch_scc with results looked up in a seisloc.cccache.CcCache first,
+    only targets not in the cache are correlated and then stored.
+
+    Parameters
+    -----------
+    tmplt_data,tar_datas,ncom,method: see batch_scc
+               cache: CcCache object, None to compute all
+              params: parameters of the key besides the waveforms, e.g.
+                      tb,te,max_shift, see seisloc.cccache.cc_key
+    """
+    if cache is None:
+        return batch_scc(tmplt_data,tar_datas,ncom,method=method)
+    if ncom == None:
+        ncom = len(tmplt_data)
+    tmplt_hash = wf_hash(tmplt_data[:ncom])
+    keys = [cc_key(tmplt_hash,wf_hash(tar_data[:ncom]),ncom=ncom,**params) for tar_data in tar_datas]
+    cached = cache.get_many(keys)
+    ccmaxs = np.zeros(len(keys))
+    aamaxs = np.zeros(len(keys))
+    i0s = np.zeros(len(keys),dtype=int)
+    todo = []
+    for k,key in enumerate(keys):
+        if key in cached:
+            ccmaxs[k],aamaxs[k],i0s[k] = cached[key]
+        else:
+            todo.append(k)
+    if len(todo) > 0:
+        tar_todo = np.asarray(tar_datas)[todo] if len(todo) < len(keys) else tar_datas
+        results = batch_scc(tmplt_data,tar_todo,ncom,method=method)
+        ccmaxs[todo],aamaxs[todo],i0s[todo] = results
+        cache.put_many([[keys[k],[ccmaxs[k],aamaxs[k],i0s[k]]] for k in todo])
+    return ccmaxs,aamaxs,i0s
 
 @jit(nopython=True)
 def data_scc(tmplt_data,st_data,ncom):
@@ -127,15 +378,451 @@ def data_scc(tmplt_data,st_data,ncom):
         j=j+1
     return ccmax,aamax,i0,cc_list
 
+def template_norm(tmplt_data):
+    """
+    sqrt of the template energy over all components, the normMaster of
+    data_scc, to be computed once for a template and passed to data_scc_batch
+    """
+    tmplt_data = np.asarray(tmplt_data,dtype=float)
+    return sqrt(np.sum(tmplt_data*tmplt_data))
+
+@jit(nopython=True,parallel=True,cache=True)
+def data_scc_batch(tmplt_data,tar_datas,norm_master,ccmaxs,aamaxs,i0s,ccs):
+    """
+    Sliding-window cross-correlation of one template against many target
+    windows, targets are distributed over threads by prange. The results
+    are the same as data_scc for each target. Outputs are written into the
+    arrays provided by the caller, the compiled kernel is cached on disk.
+
+    Parameters
+    -----------
+     tmplt_data: template waveform in shape (ncom,mm)
+      tar_datas: target windows in shape (ntar,ncom,npts), npts >= mm
+    norm_master: template norm by template_norm
+    ccmaxs,aamaxs,i0s: output arrays in length ntar, the maximum cc, the
+                 amplitude ratio and the shifting index at the maximum
+            ccs: output array in shape (ntar,npts-mm+1) for the cc of each
+                 step, or in shape (0,0) if not needed
+    Waveforms could be float32 or float64, samples are converted to float64
+    before multiplication so both give the same results.
+    """
+    ncom = tmplt_data.shape[0]
+    mm = tmplt_data.shape[1]
+    ntar = tar_datas.shape[0]
+    npts = tar_datas.shape[2]
+    keep_cc = ccs.shape[0] > 0
+    for t in prange(ntar):
+        st_data = tar_datas[t]
+        norm = 0.
+        for j in range(mm-1):
+            for ic in range(ncom):
+                v = np.float64(st_data[ic,j])
+                norm += v*v
+        ccmax = -1.
+        aamax = -1.
+        i0 = 0
+        for j in range(npts-mm+1):
+            cc = 0.
+            for ic in range(ncom):
+                v = np.float64(st_data[ic,j+mm-1])
+                norm += v*v
+                for k in range(mm):
+                    cc += np.float64(tmplt_data[ic,k])*np.float64(st_data[ic,j+k])
+            aa = sqrt(norm)/norm_master
+            cc = cc*aa/norm
+            if cc >= ccmax:
+                ccmax = cc
+                aamax = aa
+                i0 = j
+            if keep_cc:
+                ccs[t,j] = cc
+            for ic in range(ncom):
+                v = np.float64(st_data[ic,j])
+                norm -= v*v
+        ccmaxs[t] = ccmax
+        aamaxs[t] = aamax
+        i0s[t] = i0
+
+def parse_scc_cmd(cmd):
+    """
+    Read parameters from the command line of the scc program, e.g.
+    "scc -C0.6 -M3 -W-0.5/1/0.75". Options -E, -O and -T are ignored.
+
+    Return
+    ----------
+    dict with keys cc_threshold, ncom, tb, te and max_shift
+    """
+    para = {"cc_threshold":0.7,"ncom":1,"max_shift":0}
+    for item in cmd.split()[1:]:
+        if item[:2] == "-C":
+            para["cc_threshold"] = float(item[2:])
+        elif item[:2] == "-M":
+            para["ncom"] = int(item[2:])
+        elif item[:2] == "-W":
+            tmp = item[2:].split("/")
+            para["tb"] = float(tmp[0])
+            para["te"] = float(tmp[1])
+            if len(tmp) == 3:
+                para["max_shift"] = float(tmp[2])
+    if "tb" not in para:
+        raise Exception(f"Window -Wt1/t2[/maxShift] not provided in '{cmd}'")
+    return para
+
+@lru_cache(maxsize=4096)
+def _read_sac_data(sac_path):
+    """
+    Read and cache data, b value and delta of one sac file. The returned
+    array is shared between calls and should not be modified.
+    """
+    tr = obspy.read(sac_path)[0]
+    return tr.data.astype(float),tr.stats.sac.b,tr.stats.delta
+
+def scc_comp_paths(path,ncom):
+    """
+    Return the component files of one record in order r,t,z. The path in
+    the *.arr file designates one component, e.g. "XBC.z".
+    """
+    if ncom == 1:
+        return [path]
+    return [path[:-1]+comp for comp in ["r","t","z"]]
+
+def read_scc_window(path,arr,tb,te,ncom=3,max_shift=0):
+    """
+    Cut waveform window [arr+tb-max_shift,arr+te+max_shift] of one record.
+
+    Parameters
+    -----------
+         path: sac file path in the *.arr file
+          arr: arrival time relative to the sac reference time
+        tb,te: window range relative to the arrival time
+         ncom: number of component
+    max_shift: extend the window on both sides by max_shift seconds
+
+    Return
+    ----------
+    data in shape (ncom,npts) and delta. data is None if the window exceeds
+    the record.
+    """
+    datas = []
+    delta = None
+    for comp_path in scc_comp_paths(path,ncom):
+        data,b,delta = _read_sac_data(comp_path)
+        nshift = int(round(max_shift/delta))
+        mm = int(round((te-tb)/delta))
+        i1 = int(round((arr+tb-b)/delta))-nshift
+        i2 = i1+mm+2*nshift
+        if i1 < 0 or i2 > len(data):
+            return None,delta
+        datas.append(data[i1:i2])
+    return np.array(datas),delta
+
+def arr_scc(tmplt_path,tmplt_arr,tar_paths,tar_arrs,tb,te,
+            max_shift=0,ncom=3,cc_threshold=0.7,method="fft",cache=None):
+    """
+    In-process counterpart of the scc program: one template against its
+    targets, all targets correlated in one batch_scc call.
+
+    Parameters
+    -----------
+      tmplt_path: template sac path in the *.arr file
+       tmplt_arr: template arrival time
+       tar_paths: list of target sac paths
+        tar_arrs: list of target arrival times
+           tb,te: window range relative to the arrival time
+       max_shift: maximum shift in seconds
+            ncom: number of component
+    cc_threshold: only results with cc >= cc_threshold are returned
+          method: "fft", "loop" or "numba", see batch_scc
+           cache: seisloc.cccache.CcCache, results of unchanged windows are
+                  read from the cache. The filter band is covered by the
+                  waveform hash as the sac files are filtered already.
+
+    Return
+    ----------
+    list of [idx,arr,cc,aa], idx is the index of the target in tar_paths and
+    arr is the target arrival time aligned with the template
+    """
+    tmplt_data,delta = read_scc_window(tmplt_path,tmplt_arr,tb,te,ncom)
+    if tmplt_data is None:
+        return []
+    nshift = int(round(max_shift/delta))
+    idxs = []
+    tar_datas = []
+    for k in range(len(tar_paths)):
+        tar_data,tar_delta = read_scc_window(tar_paths[k],tar_arrs[k],tb,te,ncom,max_shift)
+        if tar_data is None or abs(tar_delta-delta)>1e-6*delta:
+            continue
+        idxs.append(k)
+        tar_datas.append(tar_data)
+    if len(idxs) == 0:
+        return []
+    ccmaxs,aamaxs,i0s = cached_batch_scc(tmplt_data,np.array(tar_datas),ncom,method=method,
+                                         cache=cache,tb=tb,te=te,max_shift=max_shift)
+    results = []
+    for k,ccmax,aamax,i0 in zip(idxs,ccmaxs,aamaxs,i0s):
+        if ccmax >= cc_threshold:
+            results.append([k,tar_arrs[k]+(i0-nshift)*delta,ccmax,aamax])
+    return results
+
+PHASE_CODES = {"P":0,"S":1}
+
+def write_scc_store(store_file,netsta,pha,evid1,evid2,dt,cc,aa):
+    """
+    Write SCC results of one chunk into a columnar binary file (*.npz).
+
+    Parameters
+    -----------
+     store_file: output file path, should end with ".npz"
+         netsta: network+station name
+            pha: "P" or "S"
+    evid1,evid2: event id of template and target, saved as int32
+             dt: arrival time difference arr1-arr2, saved as float32
+          cc,aa: cross-correlation coefficient and amplitude ratio, float32
+    """
+    tmp_file = store_file+".tmp"
+    with open(tmp_file,'wb') as f:
+        np.savez(f,
+                 netsta=np.array(netsta),
+                 pha=np.array(PHASE_CODES[pha],dtype=np.int8),
+                 evid1=np.asarray(evid1,dtype=np.int32),
+                 evid2=np.asarray(evid2,dtype=np.int32),
+                 dt=np.asarray(dt,dtype=np.float32),
+                 cc=np.asarray(cc,dtype=np.float32),
+                 aa=np.asarray(aa,dtype=np.float32))
+    os.replace(tmp_file,store_file)
+
+def xc2store(xc_file,sum_rev,store_file=None):
+    """
+    Convert one *.xc text file into the binary store format
+
+    Parameters
+    -----------
+       xc_file: path of the *.xc file, named as {netsta}_{pha}.{id}.xc
+       sum_rev: dict from load_sum_evstr, {event folder:[evid,...]}
+    store_file: default replaces ".xc" with ".npz"
+    """
+    if store_file == None:
+        store_file = xc_file[:-3]+".npz"
+    netsta,pha = re.split("_",os.path.basename(xc_file).split(".")[0])
+    evid1 = []; evid2 = []; dt = []; cc = []; aa = []
+    with open(xc_file,'r') as f:
+        for line in f:
+            path1,arr1,_,path2,arr2,_,_cc,_aa=re.split(" +",line.rstrip())
+            evid1.append(sum_rev[os.path.basename(os.path.dirname(path1))][0])
+            evid2.append(sum_rev[os.path.basename(os.path.dirname(path2))][0])
+            dt.append(float(arr1)-float(arr2))
+            cc.append(float(_cc))
+            aa.append(float(_aa))
+    write_scc_store(store_file,netsta,pha,evid1,evid2,dt,cc,aa)
+    return store_file
+
+class SccStore():
+    def __init__(self,work_dir="./",netsta_list=None,sum_file="out.sum"):
+        """
+        Columnar SCC results of all stations and phases under work_dir, read
+        from the {netsta}_{pha}/*.npz files written by mp_scc. Chunks only
+        available as *.xc text are converted once with the sum_file.
+
+        Attributes:
+            netstas: list of station names, indexed by self.sta
+                sta: station code of each record, int16
+                pha: phase code of each record, 0 for P and 1 for S
+        evid1,evid2: event id pair, int32
+           dt,cc,aa: arrival time difference, cc and amplitude ratio, float32
+        """
+        work_dir = os.path.abspath(work_dir)
+        if netsta_list == None:
+            netsta_list = []
+            for folder in sorted(os.listdir(work_dir)):
+                if folder[-2:] in ["_P","_S"] and os.path.isdir(os.path.join(work_dir,folder)):
+                    netsta = re.split("_",folder)[0]
+                    if netsta not in netsta_list:
+                        netsta_list.append(netsta)
+        self.netstas = list(netsta_list)
+        sum_rev = None
+        cols = {"sta":[],"pha":[],"evid1":[],"evid2":[],"dt":[],"cc":[],"aa":[]}
+        for ista,netsta in enumerate(self.netstas):
+            for pha in ["P","S"]:
+                netsta_pha_path = os.path.join(work_dir,netsta+"_"+pha)
+                if not os.path.exists(netsta_pha_path):
+                    continue
+                files = sorted(os.listdir(netsta_pha_path))
+                store_files = [file for file in files if file[-4:]==".npz"]
+                for file in files:
+                    if file[-3:]==".xc" and file[:-3]+".npz" not in files:
+                        if sum_rev == None:
+                            sum_rev = load_sum_evstr(sum_file)
+                        xc2store(os.path.join(netsta_pha_path,file),sum_rev)
+                        store_files.append(file[:-3]+".npz")
+                for file in store_files:
+                    data = np.load(os.path.join(netsta_pha_path,file))
+                    qty = len(data["evid1"])
+                    cols["sta"].append(np.full(qty,ista,dtype=np.int16))
+                    cols["pha"].append(np.full(qty,PHASE_CODES[pha],dtype=np.int8))
+                    for key in ["evid1","evid2","dt","cc","aa"]:
+                        cols[key].append(data[key])
+        dtypes = {"sta":np.int16,"pha":np.int8,"evid1":np.int32,"evid2":np.int32,
+                  "dt":np.float32,"cc":np.float32,"aa":np.float32}
+        for key in cols:
+            if len(cols[key]) == 0:
+                setattr(self,key,np.zeros(0,dtype=dtypes[key]))
+            else:
+                setattr(self,key,np.concatenate(cols[key]))
+
+    def subset(self,mask):
+        """
+        Return a new SccStore with records selected by a boolean mask or index
+        """
+        new = copy.copy(self)
+        for key in ["sta","pha","evid1","evid2","dt","cc","aa"]:
+            setattr(new,key,getattr(self,key)[mask])
+        return new
+
+    def query(self,cc_threshold=None,netstas=None,phases=None):
+        """
+        Select records by cc threshold (cc >= cc_threshold), station list and
+        phase list (e.g. ["P"]). Return a new SccStore.
+        """
+        mask = np.ones(len(self),dtype=bool)
+        if cc_threshold != None:
+            mask &= self.cc >= cc_threshold
+        if netstas != None:
+            codes = [i for i,netsta in enumerate(self.netstas) if netsta in netstas]
+            mask &= np.isin(self.sta,codes)
+        if phases != None:
+            mask &= np.isin(self.pha,[PHASE_CODES[pha] for pha in phases])
+        return self.subset(mask)
+
+    def canonical(self):
+        """
+        Return a new SccStore with evid1 < evid2 for every record. Swapped
+        records have dt negated, and aa inverted.
+        """
+        new = self.subset(slice(None))
+        swap = self.evid1 > self.evid2
+        new.evid1 = np.where(swap,self.evid2,self.evid1)
+        new.evid2 = np.where(swap,self.evid1,self.evid2)
+        new.dt = np.where(swap,-self.dt,self.dt)
+        with np.errstate(divide="ignore"):
+            new.aa = np.where(swap,1/self.aa,self.aa).astype(np.float32)
+        return new
+
+    def __len__(self):
+        return len(self.evid1)
+
+    def __repr__(self):
+        return f"SCC results of {len(self.netstas)} stations with {len(self)} records"
+
+@lru_cache(maxsize=64)
+def bp_sos(freqmin,freqmax,df,corners=4):
+    """
+    Butterworth bandpass filter in second-order sections, designed the same
+    way as obspy.signal.filter.bandpass and cached for repeated (df) values.
+    Same as obspy, highpass is returned when freqmax reaches the Nyquist.
+    """
+    fe = 0.5*df
+    low = freqmin/fe
+    high = freqmax/fe
+    if high-1.0 > -1e-6:
+        print(f"Warning: freqmax {freqmax} reaches Nyquist {fe}, apply highpass instead")
+        z,p,k = iirfilter(corners,low,btype='highpass',ftype='butter',output='zpk')
+    elif low > 1:
+        raise Exception("Selected low corner frequency is above Nyquist.")
+    else:
+        z,p,k = iirfilter(corners,[low,high],btype='band',ftype='butter',output='zpk')
+    return zpk2sos(z,p,k)
+
+@lru_cache(maxsize=64)
+def hann_taper(npts,max_percentage):
+    """
+    Hann taper of both sides, same as obspy Trace.taper(max_percentage)
+    """
+    wlen = min(int(max_percentage*npts),int(npts/2))
+    if 2*wlen == npts:
+        taper_sides = hann(2*wlen)
+    else:
+        taper_sides = hann(2*wlen+1)
+    return np.hstack((taper_sides[:wlen],np.ones(npts-2*wlen),taper_sides[len(taper_sides)-wlen:]))
+
+def bp_array(datas,df,freqmin,freqmax,taper_percentage=0.05,zerophase=True):
+    """
+    Detrend, taper and bandpass traces of the same sampling rate and length
+    along the time axis in one call. Equivalent to obspy processing:
+        detrend("linear"); detrend("constant"); taper(taper_percentage);
+        filter("bandpass",freqmin,freqmax,zerophase)
+    zerophase filtering is a forward pass and a backward pass of sosfilt as
+    obspy does, not scipy.signal.sosfiltfilt which pads the edges.
+
+    Parameters
+    -----------
+    datas: 2-D array in shape (trace quantity,npts)
+       df: sampling rate
+    """
+    datas = detrend(datas,axis=1,type="linear")
+    datas = detrend(datas,axis=1,type="constant")
+    datas *= hann_taper(datas.shape[1],taper_percentage).astype(datas.dtype)
+    sos = bp_sos(freqmin,freqmax,df)
+    datas = sosfilt(sos,datas,axis=1)
+    if zerophase:
+        datas = sosfilt(sos,datas[:,::-1],axis=1)[:,::-1]
+    return datas
+
+def _bp_traces(items,freqmin,freqmax,taper_percentage,zerophase):
+    """
+    Filter and write a list of [trace,output path], traces with equal
+    sampling rate, length and data type are processed together
+    """
+    groups = {}
+    for tr,out_path in items:
+        key = (tr.stats.sampling_rate,tr.stats.npts,tr.data.dtype.str)
+        groups.setdefault(key,[]).append([tr,out_path])
+    for (df,_,_),group in groups.items():
+        datas = np.array([tr.data for tr,_ in group])
+        datas = bp_array(datas,df,freqmin,freqmax,taper_percentage,zerophase)
+        for k,(tr,out_path) in enumerate(group):
+            tr.data = np.ascontiguousarray(datas[k])
+            tr.write(out_path,format="SAC")
+
+def _eve_wf_bp_day(src_day,tar_day,freqmin,freqmax,taper_percentage,zerophase,batch_size=3000):
+    """
+    Bandpass event waveforms of one day, read in batches of batch_size traces
+    """
+    os.mkdir(tar_day)
+    items = []
+    _eves = os.listdir(src_day)
+    _eves.sort()
+    for _eve in _eves:
+        _eve_folder = os.path.join(tar_day,_eve)
+        if not os.path.exists(_eve_folder):
+            os.mkdir(_eve_folder)
+        for sac in os.listdir(os.path.join(src_day,_eve)):
+            tr = obspy.read(os.path.join(src_day,_eve,sac))[0]
+            chn = tr.stats.channel
+            sta = tr.stats.station
+            if chn[-1] not in ["N","E","Z"]:
+                continue
+            comp = {"N":"r","E":"t","Z":"z"}[chn[-1]]
+            items.append([tr,os.path.join(_eve_folder,f"{sta}.{comp}")])
+        if len(items) >= batch_size:
+            _bp_traces(items,freqmin,freqmax,taper_percentage,zerophase)
+            items = []
+    _bp_traces(items,freqmin,freqmax,taper_percentage,zerophase)
+    return src_day
+
 def eve_wf_bp(freqmin,freqmax,
               src_folder="eve_wf",
               tar_folder="eve_wf_bp",
               taper_percentage=0.05,
-              zerophase=True):
+              zerophase=True,
+              cpu_cores=1):
     """
       bandpass event waveform
       src_folder: The source waveform folder
       tar_folder: The target waveform folder
+       cpu_cores: number of processes, each process handles one day at a
+                  time. 0 indicates using all cores.
+    Traces of the same sampling rate and length are filtered together, see
+    bp_array.
     """
     try:
         os.mkdir(tar_folder)
@@ -143,71 +830,183 @@ def eve_wf_bp(freqmin,freqmax,
         raise Exception("target folder existed!")
     _days = os.listdir(src_folder)
     _days.sort()
+    tasks = []
     for _day in _days:
-        os.mkdir(os.path.join(tar_folder,_day))
-        _eves = os.listdir(os.path.join(src_folder,_day))
-        _eves.sort()
-        for _eve in _eves:
-            _eve_folder = os.path.join(tar_folder,_day,_eve)
-            if not os.path.exists(_eve_folder):
-                os.mkdir(_eve_folder)
-            for sac in os.listdir(os.path.join(src_folder,_day,_eve)):
-                st = obspy.read(os.path.join(src_folder,_day,_eve,sac))
-                chn = st[0].stats.channel
-                sta = st[0].stats.station
-                net = st[0].stats.network
-                st.detrend("linear"); st.detrend("constant")
-                st.taper(max_percentage=taper_percentage)
-                st.filter("bandpass",freqmin=freqmin,freqmax=freqmax,zerophase=zerophase)
-                if chn[-1]=="N":
-                    st[0].write(os.path.join(_eve_folder,f"{sta}.r"),format="SAC")
-                if chn[-1]=="E":
-                    st[0].write(os.path.join(_eve_folder,f"{sta}.t"),format="SAC")
-                if chn[-1]=="Z":
-                    st[0].write(os.path.join(_eve_folder,f"{sta}.z"),format="SAC")
-
-def gen_scc_input(wf_folder,arr_folder="arr_files"):
+        tasks.append((os.path.join(src_folder,_day),os.path.join(tar_folder,_day),
+                      freqmin,freqmax,taper_percentage,zerophase))
+    if cpu_cores == 0:
+        cpu_cores = mp.cpu_count()
+    if cpu_cores == 1:
+        for task in tqdm(tasks):
+            _eve_wf_bp_day(*task)
+        return
+    with mp.Pool(processes=min(cpu_cores,len(tasks))) as pool:
+        for _ in tqdm(pool.imap_unordered(_eve_wf_bp_day_task,tasks),total=len(tasks)):
+            pass
+
+def _eve_wf_bp_day_task(task):
+    return _eve_wf_bp_day(*task)
+
+def scan_sac_headers(wf_folder,index_file=None):
+    """
+    Read network, station, channel and the a/t0 markers of all sac files
+    under wf_folder/<day>/<event>/. Results are kept in a pickle index file
+    with the file mtime and size, only new or changed files are read again.
+
+    Parameters
+    -----------
+     wf_folder: the waveform data folder
+    index_file: default is {wf_folder}/.header_index.pkl
+
+    Return
+    ----------
+    dict {sac path:[mtime,size,net,sta,chn,a,t0]}, a or t0 is None if not set
+    """
+    if index_file == None:
+        index_file = os.path.join(wf_folder,".header_index.pkl")
+    index = {}
+    if os.path.exists(index_file):
+        with open(index_file,'rb') as f:
+            index = pickle.load(f)
+    new_index = {}
+    qty_read = 0
+    _days = sorted([_day for _day in os.listdir(wf_folder) if os.path.isdir(os.path.join(wf_folder,_day))])
+    for _day in _days:
+        for _eve in sorted(os.listdir(os.path.join(wf_folder,_day))):
+            for entry in os.scandir(os.path.join(wf_folder,_day,_eve)):
+                stat = entry.stat()
+                record = index.get(entry.path)
+                if record != None and record[0] == stat.st_mtime and record[1] == stat.st_size:
+                    new_index[entry.path] = record
+                    continue
+                st = obspy.read(entry.path,headonly=True)
+                sac = st[0].stats.sac
+                new_index[entry.path] = [stat.st_mtime,stat.st_size,
+                                         st[0].stats.network,st[0].stats.station,st[0].stats.channel,
+                                         sac.a if hasattr(sac,'a') else None,
+                                         sac.t0 if hasattr(sac,'t0') else None]
+                qty_read += 1
+    if qty_read > 0 or len(new_index) != len(index):
+        with open(index_file+".tmp",'wb') as f:
+            pickle.dump(new_index,f)
+        os.replace(index_file+".tmp",index_file)
+    print(f">>> {qty_read} of {len(new_index)} sac headers read, others from the index")
+    return new_index
+
+def gen_scc_input(wf_folder,arr_folder="arr_files",incremental=False,index_file=None):
     """
     Prepare the sliding window cross-correlation input files
     Parameters:
       wf_folder: The waveform data folder
       arr_folder: The target output folder
+    incremental: keep existing arrival files and append lines of new event
+                 folders only, so that line index of old events is unchanged
+                 for the incremental run of mp_scc
+     index_file: sac header index file, see scan_sac_headers
     """
-    try:
-        shutil.rmtree(arr_folder)
-    except:
-        pass
-    os.mkdir(arr_folder)
-    _days = os.listdir(wf_folder)
-    _days.sort()
-    for _day in _days:
-        _eves = os.listdir(os.path.join(wf_folder,_day))
-        _eves.sort()
-        for _eve in _eves:
-            _eve_folder = os.path.join(wf_folder,_day,_eve)
-            if not os.path.exists(_eve_folder):
-                os.mkdir(_eve_folder)
-            for sac in os.listdir(os.path.join(wf_folder,_day,_eve)):
-                st = obspy.read(os.path.join(wf_folder,_day,_eve,sac),headonly=True)
-                chn = st[0].stats.channel
-                sta = st[0].stats.station
-                net = st[0].stats.network
-                if chn[-1]=="Z":
-                    if hasattr(st[0].stats.sac,'a'):
-                        a = st[0].stats.sac.a
-                        arr_file = os.path.join(arr_folder,f"{net}{sta}_P.arr")
-                        with open(arr_file,'a') as f:
-                            f.write(os.path.join(wf_folder,_day,_eve,sta+".z"))
-                            f.write(f"  {format(a,'5.2f')}  1\n")
-                    if hasattr(st[0].stats.sac,'t0'):
-                        t0 = st[0].stats.sac.t0
-                        arr_file = os.path.join(arr_folder,f"{net}{sta}_S.arr")
-                        with open(arr_file,'a') as f:
-                            f.write(os.path.join(wf_folder,_day,_eve,sta+".z"))
-                            f.write(f"  {format(t0,'5.2f')}  1\n")
-                        f.close()
-
-def gen_dtcc(netsta_list=None,sum_file="out.sum",work_dir="./",cc_threshold=0.7,min_link=4,max_dist=4):
+    done_eves = set()
+    if incremental and os.path.exists(arr_folder):
+        for arr_file in os.listdir(arr_folder):
+            if arr_file[-4:] != ".arr":
+                continue
+            with open(os.path.join(arr_folder,arr_file),'r') as f:
+                for line in f:
+                    done_eves.add(os.path.dirname(re.split(" +",line.strip())[0]))
+            f.close()
+    else:
+        try:
+            shutil.rmtree(arr_folder)
+        except:
+            pass
+        os.mkdir(arr_folder)
+    header_index = scan_sac_headers(wf_folder,index_file)
+    arr_lines = {}                              # {arr file name:[lines]}
+    for sac_path,[_,_,net,sta,chn,a,t0] in header_index.items():
+        _eve_folder = os.path.dirname(sac_path)
+        if _eve_folder in done_eves:            # Processed in previous runs
+            continue
+        if chn[-1]=="Z":
+            if a != None:
+                arr_lines.setdefault(f"{net}{sta}_P.arr",[]).append(
+                    os.path.join(_eve_folder,sta+".z")+f"  {format(a,'5.2f')}  1\n")
+            if t0 != None:
+                arr_lines.setdefault(f"{net}{sta}_S.arr",[]).append(
+                    os.path.join(_eve_folder,sta+".z")+f"  {format(t0,'5.2f')}  1\n")
+    for arr_file in arr_lines:
+        with open(os.path.join(arr_folder,arr_file),'a') as f:
+            f.writelines(arr_lines[arr_file])
+        f.close()
+
+class DtccWriter():
+    def __init__(self,cc_file="dt.cc",compress=False,shard_pairs=None,buffer_size=4*1024*1024):
+        """
+        Write event pairs into dt.cc through one buffered handle, pairs
+        should be provided in ascending (evid1,evid2) order.
+
+        Parameters
+        -----------
+            cc_file: output file path
+           compress: write gzip compressed file, ".gz" is appended to the name
+        shard_pairs: if set, start a new file {cc_file}.{shard id} every
+                     shard_pairs pairs
+        buffer_size: size of the write buffer in bytes
+        """
+        self.cc_file = cc_file
+        self.compress = compress
+        self.shard_pairs = shard_pairs
+        self.buffer_size = buffer_size
+        self.files = []
+        self.pair_qty = 0
+        self.last_pair = None
+        self.f = None
+        self.raw = None
+
+    def _open(self):
+        if self.f != None:
+            self.close()
+        if self.shard_pairs == None:
+            file_path = self.cc_file
+        else:
+            file_path = self.cc_file+"."+str(len(self.files))
+        if self.compress:
+            file_path += ".gz"
+            self.raw = open(file_path,'wb')
+            self.f = io.TextIOWrapper(io.BufferedWriter(gzip.GzipFile(fileobj=self.raw,mode='wb',compresslevel=6),
+                                                        buffer_size=self.buffer_size))
+        else:
+            self.f = open(file_path,'w',buffering=self.buffer_size)
+        self.files.append(file_path)
+
+    def write_pair(self,evid1,evid2,links):
+        """
+        links: list of [netsta,dt,cc,pha]
+        """
+        if self.last_pair != None and (evid1,evid2) <= self.last_pair:
+            raise Exception(f"Pair ({evid1},{evid2}) is not provided in ascending order")
+        self.last_pair = (evid1,evid2)
+        if self.f == None or (self.shard_pairs != None and self.pair_qty%self.shard_pairs==0):
+            self._open()
+        s = f"# {format(evid1,'5d')} {format(evid2,'5d')} 0\n"
+        for netsta,dt,cc,pha in links:
+            s += f"{format(netsta,'<7s')} {format(dt,'7.4f')} {format(cc,'5.3f')} {pha}\n"
+        self.f.write(s)
+        self.pair_qty += 1
+
+    def close(self):
+        if self.f == None:                      # No pair written, keep an empty file
+            self._open()
+        self.f.close()
+        if self.compress:
+            self.raw.close()
+        self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+def gen_dtcc(netsta_list=None,sum_file="out.sum",work_dir="./",cc_threshold=0.7,min_link=4,max_dist=4,compress=False,shard_pairs=None):
     '''
     This function generate dt.cc.* files from the output of SCC results
     
@@ -218,13 +1017,14 @@ def gen_dtcc(netsta_list=None,sum_file="out.sum",work_dir="./",cc_threshold=0.7,
     cc_threshold: threshold value of cross_correlation
         min_link: minumum links to form an event pair
         max_dist: maximum distance accepted to form an event pair, unit km
+        compress: write gzip compressed dt.cc.gz
+     shard_pairs: if set, split output into dt.cc.0, dt.cc.1, ... every shard_pairs pairs
+
+    Records of all station-phases are joined on (evid1,evid2) with evid1<evid2,
+    records correlated in the reverse order are swapped with dt negated.
     '''
-    sum_rev= load_sum_evstr(sum_file) # dictionary {evid: [e_lon,e_lat,e_dep,e_mag]}
     sum_dict= load_sum_evid(sum_file)    # dictionary {"YYYYmmddHHMMSSff":[e_lon,e_lat,e_dep,e_mag]}
     work_dir = os.path.abspath(work_dir)
-    evid_list = []                  # event list included by scc results
-    to_cc_list = []                 # event list included in the ouput dt.cc.* results
-    
     # Remove existing dt.cc files 
     cc_files = glob.glob(os.path.join(work_dir,"dt.cc*"))
     for cc_file in cc_files:
@@ -237,91 +1037,40 @@ def gen_dtcc(netsta_list=None,sum_file="out.sum",work_dir="./",cc_threshold=0.7,
                 if netsta not in netsta_list:
                     netsta_list.append(netsta)
     print(">>> Loading in scc results ...")
-    for netsta in tqdm(netsta_list):                                # Loop for station
-        for pha in ["P","S"]:                                 # Loop for phases
-            netsta_pha = netsta+"_"+pha
-            globals()[netsta_pha+"_cc_dict"] = {}                # Initiate dictionary
-            netsta_pha_path = os.path.join(work_dir,netsta_pha)
-            if not os.path.exists(netsta_pha_path):
-                print(netsta_pha_path+" not exist!")
-                continue
-            for file in os.listdir(netsta_pha_path):
-                if file[-3:]!=".xc":                          # none scc results file
-                    continue
-                with open(os.path.join(netsta_pha_path,file),'r') as f:
-                    for line in f:
-                        line = line.rstrip()
-                        path1,arr1,_,path2,arr2,_,_cc,_aa=re.split(" +",line.rstrip())
-                        tmp = os.path.split(path1)[0]
-                        eve_folder1 = os.path.split(tmp)[1]
-                        evid1 = sum_rev[eve_folder1][0]
-                        arr1 =float(arr1)                     # arrival time
-                        tmp = os.path.split(path2)[0]
-                        eve_folder2 = os.path.split(tmp)[1]
-                        evid2 = sum_rev[eve_folder2][0]
-                        if evid1 not in evid_list:
-                            evid_list.append(evid1)
-                        if evid2 not in evid_list:
-                            evid_list.append(evid2)
-                        arr2 = float(arr2)                    # arrival time
-                        cc = float(_cc)                        # cross correlation coefficient
-                        aa = float(_aa)                        # amplitude ratio
-                        if cc >=cc_threshold:
-                            try:
-                                globals()[netsta_pha+"_cc_dict"][evid1][evid2]=[arr1,arr2,cc,aa]
-                            except:
-                                globals()[netsta_pha+"_cc_dict"][evid1]={} # Initiation
-                                globals()[netsta_pha+"_cc_dict"][evid1][evid2]=[arr1,arr2,cc,aa]
-    evid_list.sort()
+    store = SccStore(work_dir,netsta_list,sum_file)
+    evid_list = np.unique(np.concatenate((store.evid1,store.evid2)))
+    store = store.query(cc_threshold=cc_threshold).canonical()
+    # Sort records by pair then station-phase, the later record of a
+    # duplicated pair-station-phase is kept
+    order = np.lexsort((store.pha,store.sta,store.evid2,store.evid1))
+    store = store.subset(order)
+    keys = np.column_stack((store.evid1,store.evid2,store.sta,store.pha))
+    keep = np.ones(len(store),dtype=bool)
+    keep[:-1] = np.any(keys[1:]!=keys[:-1],axis=1)
+    store = store.subset(keep)
     print("<<< Loading complete! <<<")
     
     print(">>> Preparing dt.cc files ...")
-    ##----------------
-    for i,evid1 in enumerate(evid_list):
-        print(evid1,"  ",end='\r')
-        evid1_evlo = sum_dict[evid1][1]
-        evid1_evla = sum_dict[evid1][2]
-        out_index = int(i/6000)# Every 6k events preserve in a seperate dt.cc.* file.
-                               # to avoid extreme large out file size.
-        for evid2 in evid_list[i+1:]:
-            evid2_evlo = sum_dict[evid2][1]
-            evid2_evla = sum_dict[evid2][2]
-            dist,_,_ = gps2dist_azimuth(evid1_evla,evid1_evlo,evid2_evla,evid2_evlo)
-            if dist/1000>max_dist:                          # discard large distance events
-                continue
-            link_cc=[]
-            for netsta in netsta_list:                            # Loop for stations
-                for pha in ["P","S"]:                       # Loop for phases
-                    netsta_pha = netsta+"_"+pha               
-                    try:
-                        arr1,arr2,cc,aa = globals()[netsta_pha+"_cc_dict"][evid1][evid2]
-                        link_cc.append([netsta,arr1-arr2,cc,pha])
-                    except:
-                        continue
-            if len(link_cc)>=min_link:
-                if evid1 not in to_cc_list:
-                    to_cc_list.append(evid1)
-                if evid2 not in to_cc_list:
-                    to_cc_list.append(evid2)
-                cc_file = os.path.join(work_dir,"dt.cc."+f"{out_index}")
-                with open(cc_file,'a') as f:                # Write in results
-                    f.write(f"# {format(evid1,'5d')} {format(evid2,'5d')} 0\n")
-                    for record in link_cc:
-                        f.write(f"{format(record[0],'<7s')} {format(record[1],'7.4f')} {format(record[2],'5.3f')} {record[3]}\n")
-                f.close()
+    pair_keys = store.evid1.astype(np.int64)*2**32+store.evid2
+    starts = np.flatnonzero(np.r_[True,pair_keys[1:]!=pair_keys[:-1]])
+    ends = np.r_[starts[1:],len(store)]
+    # Distance is only checked for pairs with enough links
+    evlos = np.array([sum_dict[evid][1] for evid in evid_list])
+    evlas = np.array([sum_dict[evid][2] for evid in evid_list])
+    valid = ends-starts>=min_link
+    idx1 = np.searchsorted(evid_list,store.evid1[starts[valid]])
+    idx2 = np.searchsorted(evid_list,store.evid2[starts[valid]])
+    dists,_,_ = vincenty(evlas[idx1],evlos[idx1],evlas[idx2],evlos[idx2])
+    valid[valid] = dists/1000<=max_dist
+    starts = starts[valid]
+    ends = ends[valid]
+    to_cc_list = np.unique(np.concatenate((store.evid1[starts],store.evid2[starts])))
+    netsta_fmts = [format(netsta,'<7s') for netsta in store.netstas]
+    with DtccWriter(os.path.join(work_dir,"dt.cc"),compress=compress,shard_pairs=shard_pairs) as writer:
+        for start,end in zip(starts,ends):
+            links = []
+            for k in range(start,end):
+                links.append([netsta_fmts[store.sta[k]],store.dt[k],store.cc[k],["P","S"][store.pha[k]]])
+            writer.write_pair(int(store.evid1[start]),int(store.evid2[start]),links)
     print(">>> Number of events in dt.cc is: ",len(to_cc_list))
-    
-    cont = []
-    cc_files = glob.glob(os.path.join(work_dir,"dt.cc*"))
-    cc_files.sort()
-    for cc_file in cc_files:
-        with open(cc_file,'r') as f:
-            for line in f:
-                cont.append(line)
-        f.close()
-        os.remove(cc_file)
-    with open(os.path.join(work_dir,"dt.cc"),'w') as f:
-        for line in cont:
-            f.write(line)
-    f.close()    
     print("<<< dt.cc files generated! <<<")
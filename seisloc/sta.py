@@ -1,5 +1,5 @@
 import re
-from obspy.geodetics import gps2dist_azimuth
+from seisloc.geometry import vincenty
 import json
 import copy
 import numpy as np
@@ -17,19 +17,11 @@ def sta_dist_pairs(netstas,sta_dict,group_qty=6):
       group_qty: control the quantity of cloest stations to form pairs.
     """
     pair_list = []
-    for netsta1 in netstas:     # loop for each sta
-        net1 = netsta1[:2]
-        sta1 = netsta1[2:]
-        lon1 = sta_dict[net1][sta1][0]
-        lat1 = sta_dict[net1][sta1][1]
-        dist_list = []
-        for netsta2 in netstas: # calculate distance one by one
-            net2 = netsta2[:2]
-            sta2 = netsta2[2:]
-            lon2 = sta_dict[net2][sta2][0]
-            lat2 = sta_dict[net2][sta2][1]  
-            dist,_,_ = gps2dist_azimuth(lat1,lon1,lat2,lon2)
-            dist_list.append(dist)
+    lons = np.array([sta_dict[netsta[:2]][netsta[2:]][0] for netsta in netstas])
+    lats = np.array([sta_dict[netsta[:2]][netsta[2:]][1] for netsta in netstas])
+    dist_mat,_,_ = vincenty(lats[:,None],lons[:,None],lats[None,:],lons[None,:])
+    for i,netsta1 in enumerate(netstas):     # loop for each sta
+        dist_list = list(dist_mat[i])
         dist_list_cp = dist_list.copy()
         dist_list_cp.sort()
         for i in range(1,min([group_qty+1,len(netstas)])): # 0 idx is self
@@ -194,7 +186,9 @@ def sta_sel(sta_file,c_lon,c_lat,nets=[],stas=[],radius=100):
         select_sta = True
 
     out_file = sta_file+".sel"
-    f1 = open(out_file,'w')
+    lines = []
+    lons = []
+    lats = []
     with open(sta_file,'r') as f2:
         for line in f2:
             line = line.rstrip()
@@ -205,15 +199,18 @@ def sta_sel(sta_file,c_lon,c_lat,nets=[],stas=[],radius=100):
             if len(stas)>0:   # select station
                 if sta not in stas:
                     continue
-            lon = float(_lon)
-            lat = float(_lat)
-            if c_lon<=180 and c_lon>=-180 and c_lat>=-90 and c_lat<=90:
-                dist,_,_ = gps2dist_azimuth(c_lat,c_lon,lat,lon)
-                dist_km = dist/1000
-                if dist_km > radius:
-                    continue
-            f1.write(line+"\n")
+            lines.append(line)
+            lons.append(float(_lon))
+            lats.append(float(_lat))
     f2.close()
+    keep = np.ones(len(lines),dtype=bool)
+    if c_lon<=180 and c_lon>=-180 and c_lat>=-90 and c_lat<=90 and len(lines)>0:
+        dists,_,_ = vincenty(c_lat,c_lon,np.array(lats),np.array(lons))
+        keep = dists/1000 <= radius
+    f1 = open(out_file,'w')
+    for line,k in zip(lines,keep):
+        if k:
+            f1.write(line+"\n")
     f1.close()
 
 def sta2eqt(sta_file,out_file):
@@ -0,0 +1,183 @@
+import os
+import re
+import numpy as np
+from tqdm import tqdm
+from seisloc.scc import _read_sac_data,scc_comp_paths,cached_batch_scc
+
+def build_wf_bank(arr_file,bank_file,tb,te,max_shift=0,ncom=3,evids=None):
+    """
+    Pack the waveform windows of all lines of one *.arr file into one
+    float32 array saved as {bank_file}.npy, with the index saved in
+    {bank_file}.idx in npz format. Each row keeps window [arr+tb-max_shift,
+    arr+te+max_shift] of ncom components in order r,t,z. Samples out of the
+    record are filled with zero.
+
+    Parameters
+    -----------
+      arr_file: arrival file generated by seisloc.scc.gen_scc_input
+     bank_file: output path without suffix
+         tb,te: window range relative to the arrival time
+     max_shift: maximum shift in seconds
+          ncom: number of component
+         evids: event id of each line, saved in the index if provided
+
+    Return
+    ----------
+    WfBank object of the output
+    """
+    paths = []
+    arrs = []
+    with open(arr_file,'r') as f:
+        for line in f:
+            tmp = re.split(" +",line.strip())
+            paths.append(tmp[0])
+            arrs.append(float(tmp[1]))
+    f.close()
+    qty = len(paths)
+    if evids is None:
+        evids = np.arange(qty)
+    delta = None
+    for path in paths:                           # Delta of the first record
+        if os.path.exists(scc_comp_paths(path,ncom)[0]):
+            delta = _read_sac_data.__wrapped__(scc_comp_paths(path,ncom)[0])[2]
+            break
+    if delta == None:
+        raise Exception(f"No waveform found for {arr_file}")
+    nshift = int(round(max_shift/delta))
+    mm = int(round((te-tb)/delta))
+    npts = mm+2*nshift
+    data = np.lib.format.open_memmap(bank_file+".npy.tmp",mode="w+",dtype=np.float32,shape=(qty,ncom,npts))
+    tmplt_valid = np.zeros(qty,dtype=bool)       # Unshifted window within record
+    tar_valid = np.zeros(qty,dtype=bool)         # Shifted window within record
+    print(f">>> Building waveform bank {bank_file} ...")
+    for i in tqdm(range(qty)):
+        i1s = []
+        ok = True
+        for j,comp_path in enumerate(scc_comp_paths(paths[i],ncom)):
+            if not os.path.exists(comp_path):
+                ok = False
+                break
+            rec,b,rec_delta = _read_sac_data.__wrapped__(comp_path)   # No cache needed
+            if abs(rec_delta-delta)>1e-6*delta:
+                ok = False
+                break
+            i1 = int(round((arrs[i]+tb-b)/delta))-nshift
+            k1 = max(i1,0)
+            k2 = min(i1+npts,len(rec))
+            if k2 > k1:
+                data[i,j,k1-i1:k2-i1] = rec[k1:k2]
+            i1s.append([i1,len(rec)])
+        if ok:
+            tmplt_valid[i] = all([i1+nshift>=0 and i1+nshift+mm<=n for i1,n in i1s])
+            tar_valid[i] = all([i1>=0 and i1+npts<=n for i1,n in i1s])
+    data.flush()
+    del data
+    os.replace(bank_file+".npy.tmp",bank_file+".npy")
+    with open(bank_file+".idx.tmp",'wb') as f:
+        np.savez(f,evids=np.asarray(evids,dtype=np.int32),
+                   paths=np.array(paths),
+                   arrs=np.array(arrs),
+                   tmplt_valid=tmplt_valid,
+                   tar_valid=tar_valid,
+                   para=np.array([tb,te,max_shift,delta]),
+                   ncom=np.array(ncom))
+    os.replace(bank_file+".idx.tmp",bank_file+".idx")
+    return WfBank(bank_file)
+
+class WfBank():
+    def __init__(self,bank_file):
+        """
+        Read-only access to a waveform bank built by build_wf_bank. The data
+        is memory-mapped, rows are read from disk only when sliced.
+
+        Attributes:
+               data: memmap in shape (line quantity,ncom,npts)
+              evids: event id of each line
+               arrs: arrival time of each line
+        tmplt_valid: whether the line could be used as template
+          tar_valid: whether the line could be used as target
+        """
+        self.bank_file = bank_file
+        self.data = np.load(bank_file+".npy",mmap_mode="r")
+        idx = np.load(bank_file+".idx")
+        self.evids = idx["evids"]
+        self.paths = idx["paths"]
+        self.arrs = idx["arrs"]
+        self.tmplt_valid = idx["tmplt_valid"]
+        self.tar_valid = idx["tar_valid"]
+        self.tb,self.te,self.max_shift,self.delta = idx["para"]
+        self.ncom = int(idx["ncom"])
+        self.nshift = int(round(self.max_shift/self.delta))
+        self.mm = int(round((self.te-self.tb)/self.delta))
+        self._evid_index = None
+
+    def template(self,i):
+        """
+        Template window of line i, a view of the memmap without copy
+        """
+        return self.data[i,:,self.nshift:self.nshift+self.mm]
+
+    def index(self,evid):
+        """
+        Line index of an event id
+        """
+        if self._evid_index is None:
+            self._evid_index = {evid:i for i,evid in enumerate(self.evids)}
+        return self._evid_index[evid]
+
+    def matches(self,tb,te,max_shift,ncom,qty,evids=None,paths=None,arrs=None):
+        """
+        Whether the bank is built with the same window parameters for qty
+        lines. If evids, paths or arrs of the lines are provided, they should
+        also be the same as those of the bank, so that an arrival file edited
+        to other events or picks with the same line quantity is not matched.
+        """
+        if len(self.evids) != qty or self.ncom != ncom or \
+           not np.allclose([self.tb,self.te,self.max_shift],[tb,te,max_shift]):
+            return False
+        if evids is not None and not np.array_equal(self.evids,np.asarray(evids,dtype=np.int32)):
+            return False
+        if paths is not None and not np.array_equal(self.paths,np.array(paths)):
+            return False
+        if arrs is not None and not np.array_equal(self.arrs,np.asarray(arrs,dtype=float)):
+            return False
+        return True
+
+    def scc(self,i,tar_idxs,cc_threshold=0.7,method="fft",cache=None):
+        """
+        Correlate line i with lines tar_idxs, the counterpart of
+        seisloc.scc.arr_scc reading windows from the bank. Results are
+        looked up in cache (seisloc.cccache.CcCache) first if provided.
+
+        Return
+        ----------
+        list of [idx,arr,cc,aa], idx is the index in tar_idxs and arr is the
+        target arrival time aligned with the template
+        """
+        tar_idxs = np.asarray(tar_idxs,dtype=int)
+        if not self.tmplt_valid[i]:
+            return []
+        ks = np.flatnonzero(self.tar_valid[tar_idxs])
+        if len(ks) == 0:
+            return []
+        tmplt_data = self.template(i)
+        tar_idxs = tar_idxs[ks]
+        if tar_idxs[-1]-tar_idxs[0]+1 == len(tar_idxs):      # Contiguous lines, slice without copy
+            tar_datas = self.data[tar_idxs[0]:tar_idxs[-1]+1]
+        else:
+            tar_datas = self.data[tar_idxs]                  # Gathered float32 copy
+        # float32 windows are passed on as they are, see seisloc.scc.batch_scc
+        ccmaxs,aamaxs,i0s = cached_batch_scc(tmplt_data,tar_datas,self.ncom,
+                                             method=method,cache=cache,tb=self.tb,te=self.te,
+                                             max_shift=self.max_shift)
+        results = []
+        for k,idx,ccmax,aamax,i0 in zip(ks,tar_idxs,ccmaxs,aamaxs,i0s):
+            if ccmax >= cc_threshold:
+                results.append([k,self.arrs[idx]+(i0-self.nshift)*self.delta,ccmax,aamax])
+        return results
+
+    def __len__(self):
+        return len(self.evids)
+
+    def __repr__(self):
+        return f"Waveform bank {self.bank_file} of {len(self)} lines, {self.ncom} components, {self.data.shape[2]} samples"
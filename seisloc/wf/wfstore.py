@@ -0,0 +1,191 @@
+import os
+import numpy as np
+from collections.abc import Mapping
+from functools import lru_cache
+from obspy import Stream,Trace,UTCDateTime
+
+class WfStore():
+    def __init__(self,root,mode="r",shard_size=1000):
+        """
+        Event waveform store: a directory of npz shards with a text index,
+        replacing pickled dicts of obspy Streams. Traces are appended event
+        by event and written in shards of shard_size traces, the index is
+        read on open while waveform data is only loaded when requested.
+
+        Parameters
+        -----------
+              root: store directory
+              mode: "r" read only, "a" append (create if not exists)
+        shard_size: traces per shard file
+
+        Index line format:
+            event_id phase net sta loc chn starttime sampling_rate npts shard key
+        """
+        self.root = root
+        self.mode = mode
+        self.shard_size = shard_size
+        self.index_file = os.path.join(root,"index.txt")
+        if mode == "a":
+            os.makedirs(root,exist_ok=True)
+        elif not os.path.exists(self.index_file):
+            raise Exception(f"{self.index_file} not exists")
+        self.records = []                        # parsed index lines
+        self.shard_qty = 0
+        if os.path.exists(self.index_file):
+            with open(self.index_file,'r') as f:
+                for line in f:
+                    tmp = line.split()
+                    if len(tmp) != 11:
+                        continue
+                    loc = "" if tmp[4]=="--" else tmp[4]
+                    self.records.append([tmp[0],tmp[1],tmp[2],tmp[3],loc,tmp[5],
+                                         tmp[6],float(tmp[7]),int(tmp[8]),int(tmp[9]),tmp[10]])
+                    self.shard_qty = max(self.shard_qty,int(tmp[9])+1)
+        self._buffer = []                        # [index line,data] to be written
+
+    def shard_path(self,shard):
+        return os.path.join(self.root,f"shard_{format(shard,'05d')}.npz")
+
+    def add_stream(self,event_id,phase,st):
+        """
+        Append traces of one event and phase, e.g. phase "P", "S" or "all".
+        Gaps of masked traces (e.g. from Stream.merge()) are saved as zeros,
+        npz keeps no mask.
+        """
+        if self.mode != "a":
+            raise Exception("Store opened read only")
+        if " " in event_id:
+            raise Exception("Blank is not allowed in event_id")
+        for tr in st:
+            stats = tr.stats
+            loc = stats.location if stats.location != "" else "--"
+            key = f"k{len(self._buffer)}"
+            line = [event_id,phase,stats.network,stats.station,loc,stats.channel,
+                    str(stats.starttime),repr(float(stats.sampling_rate)),str(stats.npts),
+                    str(self.shard_qty),key]
+            data = tr.data
+            if np.ma.isMaskedArray(data):
+                data = data.filled(0)
+            self._buffer.append([line,np.asarray(data)])
+        if len(self._buffer) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered traces into a new shard, then append their index
+        lines. Traces of an unfinished shard are lost on interruption, the
+        index never points to a missing shard.
+        """
+        if len(self._buffer) == 0:
+            return
+        shard_path = self.shard_path(self.shard_qty)
+        with open(shard_path+".tmp",'wb') as f:
+            np.savez(f,**{line[10]:data for line,data in self._buffer})
+        os.replace(shard_path+".tmp",shard_path)
+        with open(self.index_file,'a') as f:
+            for line,_ in self._buffer:
+                f.write(" ".join(line)+"\n")
+                loc = "" if line[4]=="--" else line[4]
+                self.records.append(line[:4]+[loc,line[5],line[6],float(line[7]),
+                                    int(line[8]),int(line[9]),line[10]])
+        self._buffer = []
+        self.shard_qty += 1
+        _load_shard.cache_clear()
+
+    def close(self):
+        if self.mode == "a":
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def event_ids(self,phase=None):
+        """
+        Event ids in the order of writing
+        """
+        ids = {}
+        for record in self.records:
+            if phase == None or record[1] == phase:
+                ids[record[0]] = None
+        return list(ids.keys())
+
+    def select(self,event_id=None,phase=None,stations=None,component=None):
+        """
+        Index records matching the conditions. component is the last
+        letter of the channel, e.g. "Z".
+        """
+        out = []
+        for record in self.records:
+            if event_id != None and record[0] != event_id:
+                continue
+            if phase != None and record[1] != phase:
+                continue
+            if stations != None and record[3] not in stations:
+                continue
+            if component != None and record[5][-1] != component:
+                continue
+            out.append(record)
+        return out
+
+    def get_stream(self,event_id,phase,stations=None,component=None):
+        """
+        Read traces of one event and phase, only shards holding the selected
+        traces are opened
+        """
+        st = Stream()
+        for record in self.select(event_id,phase,stations,component):
+            st.append(record2trace(self.root,record))
+        return st
+
+    def view(self,phase,stations=None,component=None):
+        """
+        Dict-like {event_id:Stream} of one phase, streams are read on access.
+        Could be used in place of the event_stream_p/event_stream_s dicts.
+        All events of the store are keys, an event without selected traces
+        gives an empty Stream.
+        """
+        return EventStreamView(self,phase,stations,component)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return f"Waveform store {self.root}: {len(self.records)} traces in {self.shard_qty} shards"
+
+@lru_cache(maxsize=8)
+def _load_shard(shard_path):
+    return np.load(shard_path)
+
+def record2trace(root,record):
+    event_id,phase,net,sta,loc,chn,starttime,sampling_rate,npts,shard,key = record
+    data = _load_shard(os.path.join(root,f"shard_{format(shard,'05d')}.npz"))[key]
+    header = {"network":net,"station":sta,"location":loc,"channel":chn,
+              "starttime":UTCDateTime(starttime),"sampling_rate":sampling_rate}
+    return Trace(data=data,header=header)
+
+class EventStreamView(Mapping):
+    def __init__(self,store,phase,stations=None,component=None):
+        self.store = store
+        self.phase = phase
+        self.stations = stations
+        self.component = component
+        self._records = {event_id:[] for event_id in store.event_ids()}
+        for record in store.select(phase=phase,stations=stations,component=component):
+            self._records.setdefault(record[0],[]).append(record)
+
+    def __getitem__(self,event_id):
+        if event_id not in self._records:
+            raise KeyError(event_id)
+        st = Stream()
+        for record in self._records[event_id]:
+            st.append(record2trace(self.store.root,record))
+        return st
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)